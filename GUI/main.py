@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 #---------------SYS----------------
 import sys
+import os
+import uuid
 #--------------\SYS----------------
 
 #-----------DASH Modules-----------
@@ -26,6 +28,7 @@ from viewer.treelayout import SimpleBinaryTreeLayout
 import random as rd
 import time
 import ast
+from util.session import SessionStore
 #--------------\Rest---------------
 
 #---------------Data---------------
@@ -42,8 +45,11 @@ texts = {
     "Dynamic Optimality - Almost". An O(lg lg n)-competitive online binary search tree, improving upon the\
 best previous (trivial) competitive ratio of O(lg n)'
 }
-PAUSED = True
-CURRENT_LINE = 0
+GRAPHS = ['Perfectly balanced binary search tree', 'Auxilary trees']
+MAX_KEYS = 10 ** 5      # largest tree the GUI builds
+FULL_VIEW_KEYS = 130    # larger trees are drawn with collapsed subtrees
+LOD_DEPTH = 6           # auxiliary trees starting this deep in P collapse
+MAX_FRAMES = 100        # snapshots sent to the browser for playback
 #--------------\Data---------------
 
 def validate(value):
@@ -152,8 +158,8 @@ def create_controls_dropdown():
     controls = html.Div(children=[
         dcc.Dropdown(id='graphs-choise',
                     className='twelve columns',
-                    options=[{'label': s, 'value': s} for s in figures.keys()],
-                    value=[s for s in figures.keys()],
+                    options=[{'label': s, 'value': s} for s in GRAPHS],
+                    value=[s for s in GRAPHS],
                     multi=True
                     )
         ], className='container', style={'font-size' : '15pt'})
@@ -163,39 +169,16 @@ def create_controls_graph():
     controls = html.Div(children=[
         html.Div(children=html.Div(id='graphs'), className='twelve columns', style={
             'margin' : '10px'
-            }),
-        dcc.Interval(
-            id='graph-update',
-            interval=1000)
+            })
         ], className='row my-graph')
     return controls
 
-def create_controls_slider():
-    controls = html.Div(children=[
-        html.Div(children=[
-            dcc.Slider(
-                id='speed-slider',
-                min=1,
-                max=10,
-                step=0.5,
-                value=5,
-                marks={i: 'Seconds {}'.format(i) for i in range(1, 11)}
-            )
-            ], className='container')
-        ], className='row')
-    return controls
-
 def create_controls():
     controls = html.Div(children=[
         html.Div(children=[
             html.Button(children=[
                 html.Span(className='fa fa-backward')
                     ], className='my-btn', id='prev-button', title='Previous step'),
-            html.Button(children=[
-                'Pause/Play'
-                #html.Span(className='bar bar-1'),
-                #html.Span(className='bar bar-2')
-                    ], className='my-btn play centered', id='pause-button', title='Pause or unpause autoexecution'),
             html.Button(children=[
                 html.Span(className='fa fa-forward', id='next-button', title='Next step')
                     ], className='my-btn')
@@ -254,43 +237,92 @@ app = dash.Dash(__name__, external_stylesheets=external_stylesheets, external_sc
 #---------------\App---------------
 
 
-#----------------TREE--------------
-nr_vertices = 8
-
-#naive_bst = pd.ParodyTree()
-
-#for i in range(nr_vertices):
-#    new_value = rd.randint(1, 100)
-#    naive_bst.insert(new_value)
-#endfor
-
-#res = []
-#print("START")
-tango_bst = tg.TangoTree(range(1, 16))
-naive_bst = tango_bst.parody
-#tango_bst.search(9)
-#tango_bst.search(15)
-#tango_bst.search(3)
-for i in range(100):
-    val = rd.randint(1, 15)
-    #res += [val]
-    #tango_bst.search(val)
-#print("END")
-#print(res)
-tango_view = treeview.TreeView(tango_bst,
-                  node_attributes=['d', 'min_d', 'max_d'],
-                  node_shape=tg.node_shape, plot_bg=colors['black-grey'])
-naive_view = treeview.TreeView(tree=naive_bst, layout_algorithm=SimpleBinaryTreeLayout, plot_bg=colors['black-grey'])
-
-figures = {
-    'Perfectly balanced binary search tree' : dict(data=naive_view.view(), layout=naive_view.create_layout()),
-    'Auxilary trees' : dict(data=tango_view.view(), layout=tango_view.create_layout())
-    }
+#-------------Session--------------
+class Session(object):
+
+    """
+    The state of one browser session: the trees, their views and the state
+    of the controls. Sessions are kept by a SessionStore.
+
+    Args:
+        keys (iterable, optional): The keys of the first tree.
+    """
+
+    def __init__(self, keys=range(1, 16)):
+        self.current_line = 0
+        self.clicks = {
+            'search' : None,
+            'next' : None,
+            'prev' : None, 
+            'add' : None,
+            'expand-tango' : None,
+            'expand-naive' : None
+        }
+        self.s_clicks = {
+            'search' : None,
+            'next' : None,
+            'prev' : None
+        }
+        self.build_tree(keys)
+    #end_init
+
+    def build_tree(self, keys):
+        self.tango_bst = tg.TangoTree(keys)
+        tango_lod = naive_lod = {}
+        if len(keys) >= FULL_VIEW_KEYS:
+            # the tango view follows the search, P is cut at LOD_DEPTH
+            tango_lod = dict(focus=self.tango_bst.focus, summary=tg.summary)
+            naive_lod = dict(collapse=tg.collapse_below(LOD_DEPTH), summary=tg.summary)
+        self.tango_view = treeview.TreeView(self.tango_bst,
+                      node_attributes=['d', 'min_d', 'max_d'],
+                      node_shape=tg.node_shape, plot_bg=colors['black-grey'], **tango_lod)
+        self.naive_bst = self.tango_bst.parody
+        self.naive_view = treeview.TreeView(tree=self.naive_bst, layout_algorithm=SimpleBinaryTreeLayout, plot_bg=colors['black-grey'], **naive_lod)
+        self.tango_view.view()
+        self.naive_view.view()
+        # graph name -> first snapshot of the last search
+        self.search_start = {name: 0 for name in GRAPHS}
+        # graph name -> (start, stop) of the frames the browser has
+        self.sent_frames = {}
+    #end_build_tree
+
+    def views(self):
+        """The views of the graphs by name."""
+        return {
+            'Perfectly balanced binary search tree' : self.naive_view,
+            'Auxilary trees' : self.tango_view
+        }
+    #end_views
+
+    def animation_range(self, name):
+        """
+        The snapshots of graph name played in the browser: those of the last
+        search, at most MAX_FRAMES and always the current one.
+
+        Returns:
+            (start, stop)
+        """
+        view = self.views()[name]
+        current = view.current_snapshot_index
+        start = min(self.search_start[name], current)
+        stop = min(len(view.snapshots), start + MAX_FRAMES)
+        if current >= stop:
+            start, stop = current + 1 - MAX_FRAMES, current + 1
+        return start, stop
+    #end_animation_range
+#end_Session
+
+# TANGO_SESSION_DIR set: sessions are shared by all worker processes
+sessions = SessionStore(Session, directory=os.environ.get('TANGO_SESSION_DIR'))
+#------------\Session--------------
 
 #-----------------------------------------------------------------------------------------------------------------
 
 app.config['suppress_callback_exceptions'] = True
-app.layout = html.Div(children=[
+def serve_layout():
+    # every page load is a new session
+    return html.Div(children=[
+    html.Div(str(uuid.uuid4()), id='session-id', style={'display':'none'}),
     create_header(),
     html.Hr(),
     html.H1("Layout tango binary search tree", className='text-center'),
@@ -305,11 +337,10 @@ app.layout = html.Div(children=[
         ]),
     create_controls_graph(),
     create_controls(),
-    create_controls_slider(),
     html.Div(children=[
         html.Div(children=[
             html.H1('Log of operations'),
-            generate_table(tango_bst.search_log)
+            generate_table([])
             ], className='six columns', id='table-container'),
         html.Div(children=[
             html.H1('Search value'),
@@ -319,201 +350,194 @@ app.layout = html.Div(children=[
     html.Div(id='hidden-div', style={'display':'none'})
 ], className="main-div")
 
-#-------------CallBacks-----------
-
-def next_update():
-    figures['Auxilary trees']['data'] = tango_view.next_callback()
-    figures['Perfectly balanced binary search tree']['data'] = naive_view.next_callback()
+app.layout = serve_layout
 
-def prev_update():
-    figures['Auxilary trees']['data'] = tango_view.previous_callback()
-    figures['Perfectly balanced binary search tree']['data'] = naive_view.previous_callback()
+#-------------CallBacks-----------
 
-def dropdown_update(data_names):
+def dropdown_update(session, data_names):
     if len(data_names) > 1:
         class_choice = 'six columns'
     else:
         class_choice = 'twelve columns'
+    views = session.views()
+    for data_name in list(session.sent_frames):
+        if data_name not in data_names:
+            # a graph shown again is a new plot without frames
+            del session.sent_frames[data_name]
     graphs = []
     for data_name in data_names:
+        view = views[data_name]
+        # the snapshots of the search are played by plotly in the browser,
+        # their frames are only sent when the range changes
+        start, stop = session.animation_range(data_name)
+        new_range = session.sent_frames.get(data_name) != (start, stop)
+        frames, controls = view.create_animation(start, stop, frames=new_range)
+        session.sent_frames[data_name] = (start, stop)
+        layout = view.create_layout()
+        layout.update(controls)
+        figure = dict(data=view.figure(), layout=layout)
+        if new_range:
+            figure['frames'] = frames
         graphs.append(html.Div(dcc.Graph(
                 id=data_name,
-                figure=figures[data_name],
-                animate=True,
-                animation_options=dict(
-                    transition={'duration' : 500},
-                    redraw=False
-                )
+                figure=figure,
+                # a new plot loads the frames, a step is animated to and
+                # keeps the frames in the browser
+                animate=not new_range
             ), className=class_choice, style={'border' : 'solid', 'border-color' : colors['blue'], 'border-width' : '1px'}))
     return graphs
 
-def build_tree(keys):
-    global tango_bst
-    global tango_view
-    global naive_bst
-    global naive_view
-    tango_bst = tg.TangoTree(keys)
-    tango_view = treeview.TreeView(tango_bst,
-                  node_attributes=['d', 'min_d', 'max_d'],
-                  node_shape=tg.node_shape, plot_bg=colors['black-grey'])
-    naive_bst = tango_bst.parody
-    naive_view = treeview.TreeView(tree=naive_bst, layout_algorithm=SimpleBinaryTreeLayout, plot_bg=colors['black-grey'])
-    figures['Auxilary trees'] = dict(data=tango_view.view(), layout=tango_view.create_layout())
-    figures['Perfectly balanced binary search tree']['data'] = dict(data=naive_view.view(), layout=naive_view.create_layout())
-
-clicks = {
-    'search' : None,
-    'next' : None,
-    'prev' : None, 
-    'add' : None
-}
-
-s_clicks = {
-    'search' : None,
-    'next' : None,
-    'prev' : None
-}
-
 @app.callback(
     dash.dependencies.Output('status', 'children'),
-    [dash.dependencies.Input('next-button', 'n_clicks')]
+    [dash.dependencies.Input('next-button', 'n_clicks')],
+    [State('session-id', 'children')]
     )
-def update_status(n_clicks_next):
-    time.sleep(1)
-    if n_clicks_next is not None and n_clicks_next > 0:
-        if tango_view.current_snapshot_index + 1 == len(tango_view.snapshots) and len(tango_bst.search_log) > 0:
-            return tango_bst.search_log[len(tango_bst.search_log) - 1]['text']
+def update_status(n_clicks_next, session_id):
+    with sessions.read(session_id) as session:
+        tango_view = session.tango_view
+        tango_bst = session.tango_bst
+        index = tango_view.current_snapshot_index
+        if session.clicks['next'] != n_clicks_next:
+            # update_graph has not made this step yet
+            index = min(index + 1, len(tango_view.snapshots) - 1)
+        if n_clicks_next is not None and n_clicks_next > 0:
+            if index + 1 == len(tango_view.snapshots) and len(tango_bst.search_log) > 0:
+                return tango_bst.search_log[len(tango_bst.search_log) - 1]['text']
+    #endwith
     return ''
 
-@app.callback(
-    dash.dependencies.Output('graph-update', 'interval'),
-    [dash.dependencies.Input('speed-slider', 'value')])
-def update_speed(value):
-    return value * 1000
-
 @app.callback(
     dash.dependencies.Output('table-container', 'children'),
     [dash.dependencies.Input('search-button', 'n_clicks'),
     Input('next-button', 'n_clicks'),
     Input('prev-button', 'n_clicks')
-    ])
-def update_table(n_clicks, n_clicks_next, n_clicks_prev):
-    global CURRENT_LINE
-    if n_clicks != s_clicks['search']:
-        #time.sleep(1)
-        result = [html.H1('Log of operations'),
-                generate_table(tango_bst.search_log)]
-        #tango_bst.search_log.clear()
-        s_clicks['search'] = n_clicks
-        return result
-    else:
-        if tango_bst.step:
-            if n_clicks_next != s_clicks['next']:
-                s_clicks['next'] = n_clicks_next
-                if CURRENT_LINE >= 0 and CURRENT_LINE < len(tango_bst.search_log):
-                    tango_bst.search_log[CURRENT_LINE]['highlight'] = False
-                CURRENT_LINE += 1
-                if CURRENT_LINE >= 0 and CURRENT_LINE < len(tango_bst.search_log):
-                    tango_bst.search_log[CURRENT_LINE]['highlight'] = True
-            elif n_clicks_prev != s_clicks['prev']:
-                s_clicks['prev'] = n_clicks_next
-                if CURRENT_LINE >= 0 and CURRENT_LINE < len(tango_bst.search_log):
-                    tango_bst.search_log[CURRENT_LINE]['highlight'] = False
-                CURRENT_LINE -= 1
-                if CURRENT_LINE >= 0 and CURRENT_LINE < len(tango_bst.search_log):
-                    tango_bst.search_log[CURRENT_LINE]['highlight'] = True
-        result = [html.H1('Log of operations'),
-                generate_table(tango_bst.search_log)]
-        #tango_bst.search_log.clear()
-        return result
-
-@app.callback(
-    dash.dependencies.Output('hidden-div', 'value'),
-    [dash.dependencies.Input('pause-button', 'n_clicks')])
-def update_pause(n_clicks):
-    if n_clicks is not None and n_clicks > 0:
-        global PAUSED
-        PAUSED = not PAUSED
-    return ''
-
-@app.callback(
-    dash.dependencies.Output('Auxilary trees', 'animation_options'),
-    [dash.dependencies.Input('speed-slider', 'value')])
-def update_output(value):
-    return dict(frame=dict(duration=value * 1000, redraw=False), transition={'duration' : value * 1000})
-
-@app.callback(
-    dash.dependencies.Output('Layout tango binary search tree', 'animation_options'),
-    [dash.dependencies.Input('speed-slider', 'value')])
-def update_output(value):
-    return dict(frame=dict(duration=value * 1000, redraw=False), transition={'duration' : value * 1000})
+    ],
+    [State('session-id', 'children')])
+def update_table(n_clicks, n_clicks_next, n_clicks_prev, session_id):
+    with sessions.open(session_id) as session:
+        tango_bst = session.tango_bst
+        s_clicks = session.s_clicks
+        if n_clicks != s_clicks['search']:
+            #time.sleep(1)
+            result = [html.H1('Log of operations'),
+                    generate_table(tango_bst.search_log)]
+            #tango_bst.search_log.clear()
+            s_clicks['search'] = n_clicks
+            return result
+        else:
+            if tango_bst.step:
+                log = tango_bst.search_log
+                if n_clicks_next != s_clicks['next']:
+                    s_clicks['next'] = n_clicks_next
+                    if session.current_line >= 0 and session.current_line < len(log):
+                        log[session.current_line]['highlight'] = False
+                    session.current_line += 1
+                    if session.current_line >= 0 and session.current_line < len(log):
+                        log[session.current_line]['highlight'] = True
+                elif n_clicks_prev != s_clicks['prev']:
+                    s_clicks['prev'] = n_clicks_next
+                    if session.current_line >= 0 and session.current_line < len(log):
+                        log[session.current_line]['highlight'] = False
+                    session.current_line -= 1
+                    if session.current_line >= 0 and session.current_line < len(log):
+                        log[session.current_line]['highlight'] = True
+            result = [html.H1('Log of operations'),
+                    generate_table(tango_bst.search_log)]
+            #tango_bst.search_log.clear()
+            return result
 
 @app.callback(
     Output('hidden-div','placeholder'),
     [Input('search-button', 'n_clicks'),
     Input('vis-all', 'values')],
-    [State('search-box', 'value')])
-def search_update(n_clicks, checked, value):
-    tango_bst.search_log.clear()
-    global CURRENT_LINE
-    CURRENT_LINE = 0
-    prev_snapshot_t = tango_view.current_snapshot_index
-    prev_snapshot_n = naive_view.current_snapshot_index
-    if n_clicks != clicks['search']:
-        if 'step' not in checked:
-            tango_bst.step = False
-        elif 'step' in checked:
-            tango_bst.step = True
-        value = validate(value.split(','))
-        for i in value:
-            tango_bst.search(i)
-            if 'vis' in checked:
-                tango_view.view()
-                naive_bst.view()
-    tango_view.current_snapshot_index = prev_snapshot_t
-    naive_view.current_snapshot_index = prev_snapshot_n
-    #figures['Auxilary trees']['data'] = tango_view.view()
+    [State('search-box', 'value'),
+    State('session-id', 'children')])
+def search_update(n_clicks, checked, value, session_id):
+    with sessions.open(session_id) as session:
+        tango_bst = session.tango_bst
+        tango_view = session.tango_view
+        naive_view = session.naive_view
+        tango_bst.search_log.clear()
+        session.current_line = 0
+        prev_snapshot_t = tango_view.current_snapshot_index
+        prev_snapshot_n = naive_view.current_snapshot_index
+        if n_clicks != session.clicks['search']:
+            session.search_start = {name: view.current_snapshot_index
+                                    for name, view in session.views().items()}
+            if 'step' not in checked:
+                tango_bst.step = False
+            elif 'step' in checked:
+                tango_bst.step = True
+            value = validate(value.split(','))
+            # times the log entries, detached again before the session is saved
+            with tg.log_profiler(tango_bst).attached(tango_bst):
+                for i in value:
+                    tango_bst.search(i)
+                    if 'vis' in checked:
+                        tango_view.view()
+                        session.naive_view.view()
+            #endwith
+        tango_view.current_snapshot_index = prev_snapshot_t
+        naive_view.current_snapshot_index = prev_snapshot_n
+
+@app.callback(
+    Output('hidden-div','title'),
+    [Input('Auxilary trees', 'clickData'),
+    Input('Perfectly balanced binary search tree', 'clickData')],
+    [State('session-id', 'children')])
+def expand_update(tango_click, naive_click, session_id):
+    # a click on a summary glyph expands the collapsed subtree
+    with sessions.open(session_id) as session:
+        for name, view, click in (('expand-tango', session.tango_view, tango_click),
+                                  ('expand-naive', session.naive_view, naive_click)):
+            if click is not None and click != session.clicks[name]:
+                session.clicks[name] = click
+                for point in click['points']:
+                    if 'customdata' in point:
+                        view.expand(point['customdata'])
+    return ''
 
 @app.callback(
     Output('graphs','children'),
     [Input('graphs-choise', 'value'),
     Input('next-button', 'n_clicks'),
     Input('prev-button', 'n_clicks'),
-    Input('add-button', 'n_clicks')],
-    [State('add-box', 'value')],
-    events=[dash.dependencies.Event('graph-update', 'interval')]
+    Input('add-button', 'n_clicks'),
+    Input('hidden-div', 'placeholder'),
+    Input('hidden-div', 'title')],
+    [State('add-box', 'value'),
+    State('session-id', 'children')]
     )
-def update_graph(data_names, n_clicks_next=0, n_clicks_prev=0, n_clicks_add=0, value_add=1):
-    global PAUSED
-    if n_clicks_next != clicks['next']:
-        next_update()
-        clicks['next'] = n_clicks_next
-        PAUSED = True
-    elif n_clicks_prev != clicks['prev']:
-        prev_update()
-        clicks['prev'] = n_clicks_prev
-        PAUSED = True
-    elif clicks['add'] != n_clicks_add:
-        if '...' in value_add:
-            my_range = validate_input(value_add.split('...'))
-            try:
-                rg = range(my_range[0], my_range[1])
-                print(len(rg))
-                if len(rg) > 1 and len(rg) < 130:
-                    build_tree(rg)
-            except Exception as e:
-                pass
-        elif ',' in value_add:
-            my_range = validate_input(value_add.split(','))
-            if len(my_range) > 1 and len(my_range) < 130:
-                build_tree(my_range)
-        clicks['add'] = n_clicks_add
-        PAUSED = True
-    if not PAUSED:
-        next_update()
-
-    graphs = dropdown_update(data_names)
-    return graphs
+def update_graph(data_names, n_clicks_next=0, n_clicks_prev=0, n_clicks_add=0, searched=None, expanded=None, value_add=1, session_id=None):
+    # runs after a search or an expansion (their outputs) to show the result
+    with sessions.open(session_id) as session:
+        clicks = session.clicks
+        if n_clicks_next != clicks['next']:
+            session.tango_view.next_callback()
+            session.naive_view.next_callback()
+            clicks['next'] = n_clicks_next
+        elif n_clicks_prev != clicks['prev']:
+            session.tango_view.previous_callback()
+            session.naive_view.previous_callback()
+            clicks['prev'] = n_clicks_prev
+        elif clicks['add'] != n_clicks_add:
+            if '...' in value_add:
+                my_range = validate_input(value_add.split('...'))
+                try:
+                    rg = range(my_range[0], my_range[1])
+                    print(len(rg))
+                    if len(rg) > 1 and len(rg) <= MAX_KEYS:
+                        session.build_tree(rg)
+                except Exception as e:
+                    pass
+            elif ',' in value_add:
+                my_range = validate_input(value_add.split(','))
+                if len(my_range) > 1 and len(my_range) <= MAX_KEYS:
+                    session.build_tree(my_range)
+            clicks['add'] = n_clicks_add
+
+        graphs = dropdown_update(session, data_names)
+        return graphs
 
 if __name__ == '__main__':
     app.run_server(debug=True, threaded=True)
@@ -113,7 +113,7 @@ from tree.rb import RBNode, RED, BLACK
 from tree.naive import perfect_inserter
 #-------------------\AUX TREES-----------------------
 
-import time
+from tree.profiling import Profiler
 import datetime as dt
 
 #----------------------CONST-------------------------
@@ -122,6 +122,7 @@ SEARCH_END = 20
 SEARCH_SUCCESS = 30
 CUT = 40
 JOIN = 50
+SWITCH = 60
 #---------------------\CONST-------------------------
 
 def is_root_or_None(node):
@@ -148,6 +149,8 @@ class TangoNode(RBNode):
         min_depth (int): The minimum depth of all nodes in auxiliary tree.
         max_depth (int): The maximum depth of all nodes in auxiliary tree.
         is_root (bool): True if this node is the root of an auxiliary tree.
+        prev (TangoNode): The predecessor in the auxiliary tree or None.
+        next (TangoNode): The successor in the auxiliary tree or None.
     """
 
     def __init__(self, key,
@@ -164,6 +167,10 @@ class TangoNode(RBNode):
 
         self.is_root = is_root
 
+        # In-order threads of the auxiliary tree, maintained by
+        # TangoTree._switch(). Rotations, splits and joins keep the order.
+        self.prev = None
+        self.next = None
     #end__init__
 
     def _update_depths(self):
@@ -248,6 +255,16 @@ class TangoTree(BinaryTree):
         self.step = True
 
         fix_depth(self.root)
+
+        # Sets of nodes changed since the set was handed out by watch().
+        self._change_sets = []
+
+        # The nodes changed by the last search, watched from the first
+        # call of focus() on, see there.
+        self._focus_changes = None
+
+        # Counters reported by stats().
+        self._search_stats = {'searches': 0, 'skipped': 0}
     #end__init__
 
     def insert(self, key, data=None):
@@ -284,7 +301,6 @@ class TangoTree(BinaryTree):
     #end_insert
 
     def search(self, key):
-        start = time.time()
         """
         Search for key in the tree.
 
@@ -296,6 +312,8 @@ class TangoTree(BinaryTree):
         """
         self.search_log.append({'text' : "Start search for {}".format(key), 
             'act' : SEARCH_START, 'time' : 0, 'highlight' : True})
+        if self._focus_changes is not None:
+            self._focus_changes.clear()
 
         # Start at the root.
         p = self.root
@@ -310,16 +328,13 @@ class TangoTree(BinaryTree):
                 break #<------------------------------------------------------------------------------------------------------------
             #endif
 
-            # If we visit a marked node we have to modifiy the preferred paths
-            # 1 Cut auxiliary tree containing the parent of p at p.min_depth-1.
-            #       into a top and a bottom path.
-            # 2 Join the top path with auxiliary tree rooted at p.
+            # If we visit a marked node we have to modifiy the preferred paths:
+            # the node x of depth p.min_depth-1 above p (its parent in P)
+            # switches its preferred child to the child whose auxiliary tree
+            # is rooted at p.
             if p is not None and p.is_root:
-                depth = p.min_depth - 1
-                n = p
-                p = p.parent
-                p = self._new_cut(p, depth)
-                p = self._new_join(p, n, depth)
+                x = self._parent_in_reference(p)
+                p = self._switch(x, p.key < x.key)
             #endif
         #endwhile
 
@@ -330,29 +345,28 @@ class TangoTree(BinaryTree):
         # if p.key != key:
         #     p = self._aux_search(key, p)
 
-        # Finally set the preferred child of the access p to left.
-        # 1 cut its auxiliary tree at depth p.depth
-        # 2 join with preceding marked node
-        #print("final cut&join")----------------------------------------------------------------------
-        r = None
+        # Finally set the preferred child of the access p to left. This
+        # changes nothing if it already is the left child or if p has neither
+        # a preferred nor a left child, e.g. when p is accessed again.
         if p is not None:
-            r = self._cut_at(p)
-
-        marked_p = None
-        if not r is None:
-            marked_p = self.find_marked_predeccessor(r, p.key)
-
-        if marked_p is not None:
-            self._new_join(r, marked_p, p.depth)
+            self._search_stats['searches'] += 1
+            side = self._preferred_side(p)
+            if side is True or (side is None and
+                                self._child_tree(p, True) is None):
+                self._search_stats['skipped'] += 1
+            else:
+                self._switch(p, True)
+            #endif
+        #endif
 
         #print("Search: Found", p.key)----------------------------------------------------------------
-        end = time.time()
+        # the times are filled in by log_profiler()
         if p is not None:
             self.search_log.append({'text' : "Search: Found {}".format(p.key), 
-                'act' : SEARCH_SUCCESS, 'time' : end - start, 'highlight' : False})
+                'act' : SEARCH_SUCCESS, 'time' : 0, 'highlight' : False})
         else:
             self.search_log.append({'text' : "Search: key not found", 
-                'act' : SEARCH_END, 'time' :  end - start, 'highlight' : False})
+                'act' : SEARCH_END, 'time' : 0, 'highlight' : False})
 
         self.parody.find(self.parody.root, key)
         if p is not None:
@@ -361,6 +375,84 @@ class TangoTree(BinaryTree):
             return None
     #end_search
 
+    def peek(self, key):
+        """
+        Look key up without restructuring the tree.
+
+        Unlike search() this does not cut or join any preferred paths, so it
+        leaves the learned structure untouched and never writes to a node.
+        It is safe to run concurrently with other readers as long as no
+        search() runs at the same time.
+
+        Returns:
+            The key if it is in the tree, otherwise None.
+        """
+        try:
+            key = int(float(key))
+        except Exception as e:
+            return None
+
+        # The auxiliary trees hang into each other in key order, so the whole
+        # structure is one BST and a plain walk ignoring the marks is enough.
+        p = self.root
+        while p is not None:
+            if p.key < key:
+                p = p.right
+            elif p.key > key:
+                p = p.left
+            else:
+                return p.key
+            #endif
+        #endwhile
+        return None
+    #end_peek
+
+    def contains(self, key):
+        """Read-only membership test, see peek()."""
+        return self.peek(key) is not None
+    #end_contains
+
+    def stats(self):
+        """
+        Returns:
+            A dict with the number of successful searches, the number of
+            them that needed no restructuring at the accessed node
+            ('skipped') and the fraction of skipped ones ('skip_rate').
+        """
+        stats = dict(self._search_stats)
+        stats['skip_rate'] = (stats['skipped'] / stats['searches']
+                              if stats['searches'] else 0.0)
+        return stats
+    #end_stats
+
+    def watch(self):
+        """
+        Start recording which nodes get modified.
+
+        Returns:
+            set: A set that collects every node whose children, color or
+            mark change from now on. The caller may clear() it at any time;
+            pass it to unwatch() to stop recording.
+        """
+        changes = set()
+        self._change_sets.append(changes)
+        return changes
+    #end_watch
+
+    def unwatch(self, changes):
+        """Stop filling a set returned by watch()."""
+        self._change_sets.remove(changes)
+    #end_unwatch
+
+    def _touch(self, *nodes):
+        """Record nodes as modified for all watchers."""
+        if not self._change_sets:
+            return
+        for changes in self._change_sets:
+            changes.update(nodes)
+            changes.discard(None)
+    #end_touch
+
     def _aux_search(self, key, root):
         """
         Search key in the auxiliary tree with the given root.
@@ -430,259 +522,264 @@ class TangoTree(BinaryTree):
 
         if p.color == BLACK:
             p.bh += 1
-    #end_update_black_height
-
-    def _aux_update_bh(self, n):
-
-        self.update_black_height(n)
-
-        while not self.is_root(n):
-            n = n.parent
-            self.update_black_height(n)
 
+        # Every color change is followed by an update of the black height.
+        self._touch(p)
+    #end_update_black_height
 
-    def _new_cut(self, p, cut_depth):
+    def _parent_in_reference(self, n):
         """
-        Cut the auxiliary tree containing p into two auxiliary trees, one
-        containing all nodes with depth <= d and one with depths > d.
+        Returns the parent in P of the marked node n, i.e. the node of depth
+        n.min_depth - 1 in the auxiliary tree above n.
 
-        Returns:
-            The root of the top path.
+        n hangs between two consecutive keys of that auxiliary tree, its
+        parent in the auxiliary tree and the predecessor (or successor) of
+        the parent. Both are ancestors of n in P and the deeper one is the
+        parent.
         """
-        # TODO explain cutting
-        #print("Cut at", p.key, "depth", cut_depth)------------------------------------------------------------------
-        t_key = p.key
-        start = time.time()
-
-        new_root = None
-        p = self._aux_go_to_root(p)
-
-        l = self.min_with_depth(p, cut_depth)
-        r = self.max_with_depth(p, cut_depth)
-
-        lp = None
-        if l is not None:
-            lp = self._get_predecessor(l)
-        rp = None
-        if r is not None:
-            rp = self._get_successor(r)
-
-        if lp is None and rp is None:
-            new_root = p
-        elif rp is None:
-
-            self._split(lp, p)
-
-            if lp.right is not None:
-                self.mark_node(lp.right)
-            self._aux_update_depths(lp)
-
-            new_root = self._aux_merge(lp)
+        p = n.parent
+        if p.depth == n.min_depth - 1:
+            return p
+        if n is p.left:
+            return p.prev
+        return p.next
+    #end_parent_in_reference
+
+    def _link(self, a, b):
+        """Make a and b neighbours in the in-order list, both may be None."""
+        if a is not None:
+            a.next = b
+        if b is not None:
+            b.prev = a
+    #end_link
+
+    def aux_inorder(self, p):
+        """
+        Yields the nodes of the auxiliary tree containing p in key order.
+        """
+        while p.prev is not None:
+            p = p.prev
+        while p is not None:
+            yield p
+            p = p.next
+        #endwhile
+    #end_aux_inorder
 
-        elif lp is None:
+    def focus(self):
+        """
+        The nodes to show in a focus-and-context view of the current (or
+        last) search, for TreeView(focus=...): the auxiliary trees the
+        search changed and the auxiliary trees they hang from, or the top
+        auxiliary tree before the first change.
+
+        The work is proportional to the size of these auxiliary trees. The
+        first call starts recording the changes, a tree without a focus
+        view does not pay for it.
+        """
+        if self._focus_changes is None:
+            self._focus_changes = self.watch()
+        roots = set()
+        for node in self._focus_changes or [self.root]:
+            while not node.is_root:
+                node = node.parent
+            roots.add(node)
+
+            # the auxiliary tree above
+            node = node.parent
+            if node is not None:
+                while not node.is_root:
+                    node = node.parent
+                roots.add(node)
+            #endif
+        #endfor
 
-            self._split(rp, p)
+        nodes = []
+        for root in roots:
+            nodes.extend(self.aux_inorder(root))
+        return nodes
+    #end_focus
 
-            if rp.left is not None:
-                self.mark_node(rp.left)
-            self._aux_update_depths(rp)
+    def _preferred_side(self, x):
+        """
+        Returns True if the preferred child of x in P is its left child,
+        False if it is the right child and None if x has no preferred child.
 
-            new_root = self._aux_merge(rp)
+        The preferred path below x is the range of deeper keys next to x in
+        its auxiliary tree, all other keys there belong to ancestors of x,
+        so only the two neighbours of x have to be compared with x.
+        """
+        if x.prev is not None and x.prev.depth > x.depth:
+            return True
+        if x.next is not None and x.next.depth > x.depth:
+            return False
+        return None
+    #end_preferred_side
 
+    def _child_tree(self, x, left):
+        """
+        Returns the root of the auxiliary tree hanging next to x on the given
+        side, i.e. the tree of that child of x in P, or None. Only valid if
+        the preferred path below x is not on this side.
+        """
+        if left:
+            c = x.left
+            if not is_root_or_None(c):
+                while not is_root_or_None(c.right):
+                    c = c.right
+                c = c.right
+            #endif
         else:
-
-            self._split(lp, p)
-            self._split(rp, lp.right)
-
-            if rp.left is not None:
-                self.mark_node(rp.left)
-            self._aux_update_depths(rp)
-
-            self._aux_merge(rp)
-            new_root = self._aux_merge(lp)
+            c = x.right
+            if not is_root_or_None(c):
+                while not is_root_or_None(c.left):
+                    c = c.left
+                c = c.left
+            #endif
         #endif
-        #print(self._viewer)
-        if self.step:
-            self.view(highlight_nodes=[new_root])
+        return c
+    #end_child_tree
 
-        #self.parody.update_roots(self.parody.root)
-
-        #self.parody.view()
-        end = time.time()
-        self.search_log.append({'text' : "Cut at {}".format(t_key), 
-            'act' : CUT, 'time' : end - start, 'highlight' : False})
-
-        return new_root
+    def _switch(self, x, to_left):
+        """
+        Switch the preferred child of x to its left (to_left=True) or right
+        child in P.
 
-    def _new_join(self, top_path, n, cut_depth):
+        This is the cut of the auxiliary tree of x at depth x.depth fused with
+        the join of the auxiliary tree of the new preferred child. x is split
+        off once and each side of x is split at most once more:
 
-        start = time.time()
-        new_root = None
+        * on the side of the old preferred path D (the nodes deeper than x)
+          at the neighbour of D, exposing D, which gets marked,
+        * on the side of the new preferred child at the neighbour of x,
+          exposing the auxiliary tree B hanging there, which gets unmarked.
 
-        lp = None
-        rp = None
+        If D and B are on the same side, B is D and nothing changes but the
+        balance. Each piece is merged back once, i.e. at most three splits
+        and three merges instead of four each for a separate cut and join.
 
-        p = top_path
+        Args:
+            x (TangoNode): The node whose preferred child changes.
+            to_left (bool): True for the left child, False for the right one.
 
-        while p is not None and p != n:
-            if p.key > n.key:
-                rp = p
-                p = p.left
-            else:
-                lp = p
-                p = p.right
+        Returns:
+            The root of the auxiliary tree containing x afterwards.
+        """
+        root = self._aux_go_to_root(x)
+        # The old preferred path D below x, its first node l and last node r,
+        # and the node next to D on the other side than x. D is adjacent to
+        # x, so only its far end has to be searched.
+        cut_left = self._preferred_side(x)
+        cut_at = None
+        if cut_left is True:
+            l = self.min_with_depth(root, x.depth)
+            r = x.prev
+            cut_at = l.prev
+        elif cut_left is False:
+            l = x.next
+            r = self.max_with_depth(root, x.depth)
+            cut_at = r.next
         #endif
 
-        if lp is None and rp is None:
-            raise Exception("SHOULDN`T HAPPEN")
-        elif rp is None:
+        # The node next to x on the side of the new preferred child.
+        if cut_left == to_left:
+            join_at = cut_at
+        elif to_left:
+            join_at = x.prev
+        else:
+            join_at = x.next
+        #endif
 
-            self._split(lp, top_path)
+        self._split(x, root)
 
-            if lp.right is not None:
-                self.unmark_node(lp.right)
-                self._aux_update_depths(lp.right)
+        for left in (True, False):
+            if left == cut_left:
+                at = cut_at
+            elif left == to_left:
+                at = join_at
             else:
-                self._aux_update_depths(lp)
-
-            new_root = self._aux_merge(lp)
-        elif lp is None:
-
-            self._split(rp, top_path)
+                continue
+            #endif
 
-            if rp.left is not None:
-                self.unmark_node(rp.left)
-                self._aux_update_depths(rp.left)
+            # The subtree between x and at.
+            if left:
+                side = x.left
+                if at is not None:
+                    self._split(at, side)
+                    side = at.right
             else:
-                self._aux_update_depths(rp)
-
-            new_root = self._aux_merge(rp)
+                side = x.right
+                if at is not None:
+                    self._split(at, side)
+                    side = at.left
+            #endif
 
-        else:
+            if left == cut_left and left != to_left:
+                self.mark_node(side)
+            elif left == to_left and left != cut_left and side is not None:
+                self.unmark_node(side)
+                first = side
+                while not is_root_or_None(first.left):
+                    first = first.left
+                last = side
+                while not is_root_or_None(last.right):
+                    last = last.right
+                # B enters the in-order list of x.
+                if to_left:
+                    self._link(join_at, first)
+                    self._link(last, x)
+                else:
+                    self._link(x, first)
+                    self._link(last, join_at)
+                #endif
+            #endif
 
-            self._split(lp, top_path)
-            self._split(rp, lp.right)
+            if at is not None:
+                self._aux_merge(at)
+        #endfor
 
-            if rp.left is not None:
-                self.unmark_node(rp.left)
-                self._aux_update_depths(rp.left)
+        # D leaves the in-order list of x.
+        if cut_left is not None and cut_left != to_left:
+            if cut_left:
+                self._link(cut_at, x)
             else:
-                self._aux_update_depths(rp)
-
-            self._aux_merge(rp)
-
-            new_root = self._aux_merge(lp)
+                self._link(x, cut_at)
+            l.prev = None
+            r.next = None
         #endif
 
-        if self.step:
-            self.view()
+        new_root = self._aux_merge(x)
 
-        #self.parody.update_roots(self.parody.root)
-        #self.parody.view()
-        end = time.time()
-        self.search_log.append({'text' : "Join at {}".format(top_path.key), 
-            'act' : JOIN, 'time' : end - start, 'highlight' : False})
+        if self.step:
+            self.view(highlight_nodes=[new_root])
 
+        self.search_log.append({'text' : "Switch at {}".format(x.key),
+            'act' : SWITCH, 'time' : 0, 'highlight' : False})
         return new_root
-
+    #end_switch
 
     def _aux_update_depths(self, p):
         """
         Update the min_depth and max_depth of p and its ancestors in auxiliary
         tree.
 
-        This is be needed if you mark or unmark a node thus changing an
-        auxiliary tree.
+        The augmentation is maintained incrementally: rotations fix the two
+        rotated nodes themselves and _join() calls this exactly once for
+        the spine above the node it links in. Marking or unmarking a child
+        is always followed by an _aux_merge() of its parent, which
+        recomputes the parent, so cuts and joins need no extra pass.
 
         Returns:
             The argument p.
         """
-        p._update_depths()
-        p_key = p.key
+        n = p
+        n._update_depths()
 
-        while not self.is_root(p):
-            p = p.parent
-            p._update_depths()
-
-        # go down to the saved key again
-        p = self._aux_search(p_key, p)
+        while not self.is_root(n):
+            n = n.parent
+            n._update_depths()
 
         return p
 
-    # The methods _find_predecessor(self, p) and _find_successor(self, p)
-    # do not return p.
-    def _find_predecessor(self, p):
-        """
-        Returns the predecessor of a node in an auxiliary tree if it exists,
-        otherwise p itself.
-
-        Returns:
-            (pred, True) if pred is the predecessor of p, otherwise
-            (p, False) if there is no predecessor.
-        """
-        # Case 1: left subtree is not empty
-        #   the maximum node of the left subtree is the predecessor
-        if not is_root_or_None(p.left):
-            # if left child exists go left and then all the way right
-            p = p.left
-            while not is_root_or_None(p.right):
-                p = p.right
-            return p, True
-
-        # Case 2: left subtree is empty
-        #   go up until we come from a right child
-        #   this parent is the predecessor
-        # Case 3: no parent (and left subtree) exists
-        #   there is no predecessor
-        p_key = p.key
-        while True:
-            if self.is_root(p):
-                # Case 3: no predecessor
-                # We have to go back to p
-                p = self._aux_search(p_key, p)
-                return p, False
-            if p == p.parent.right:
-                return p.parent, True
-            else:
-                p = p.parent    # go up
-
-    def _find_successor(self, p):
-        """
-        Returns the successor of a node in an auxiliary tree if it exists,
-        otherwise p itself.
-
-        Returns:
-            (succ, True) if succ is the successor of p, otherwise
-            (p, False) if there is no successor.
-        """
-        # This is symmetric with _find_predecessor swapping left and right.
-
-        # Case 1: right subtree is not empty
-        #   the maximum node of the right subtree is the successor
-        if not is_root_or_None(p.right):
-            # if right child exists go right and then all the way left
-            p = p.right
-            while not is_root_or_None(p.left):
-                p = p.left
-            return p, True
-
-        # Case 2: right subtree is empty
-        #   go up until we come from a left child
-        #   this parent is the successor
-        # Case 3: no parent (and right subtree) exists
-        #   there is no successor
-        p_key = p.key
-        while True:
-            if self.is_root(p):
-                # Case 3: no successor
-                # We have to go back to p
-                p = self._aux_search(p_key, p)
-                return p, False
-            if p == p.parent.left:
-                return p.parent, True
-            else:
-                p = p.parent    # go up
-
 #------------------------------------------------TEST----------------------------------------------------
 
     def is_root(self, p):
@@ -719,12 +816,14 @@ class TangoTree(BinaryTree):
                 return None
 
     def clear_parent_reference(self, n):
+        self._touch(n.parent)
         if n == n.parent.left:
             n.parent.left = None
         elif n == n.parent.right:
             n.parent.right = None
 
     def set_parent_reference(self, p, n):
+        self._touch(p.parent)
         if p == p.parent.left:
             p.parent.left = n
         elif p == p.parent.right:
@@ -736,6 +835,7 @@ class TangoTree(BinaryTree):
             return
         self.clear_parent_reference(child)
         child.parent = None
+        self._touch(child)
 
     def attach_up(self, child, parent):
         if child is None:
@@ -745,60 +845,29 @@ class TangoTree(BinaryTree):
         else:
             parent.right = child
         child.parent = parent
+        self._touch(child, parent)
 
     def attach_left(self, child, parent):
         if child is None:
             return
         parent.left = child
         child.parent = parent
+        self._touch(child, parent)
 
     def attach_right(self, child, parent):
         if child is None:
             return
         parent.right = child
         child.parent = parent
+        self._touch(child, parent)
 
     def mark_node(self, node):
         node.is_root = True
+        self._touch(node)
 
     def unmark_node(self, node):
         node.is_root = False
-
-    def get_max_child(self, p):
-        prev = p
-        while self.has_right(p):
-            prev = p
-            p = p.right
-        if prev.right is not None and not prev.right.is_root:
-            return prev.right
-        return prev
-    #end_get_max_child
-
-    def get_min_child(self, p):
-        prev = p
-        while self.has_left(p):
-            prev = p
-            p = p.left
-        if prev.left is not None and not prev.left.is_root:
-            return prev.left
-        return prev
-    #end_get_min_child
-
-    def find_min_with_bh(self, p, bh):
-        while not is_root_or_None(p):
-
-            if p.color == BLACK and p.bh == bh:
-                break
-            p = p.left
-        return p
-
-    def find_max_with_bh(self, p, bh):
-        while not is_root_or_None(p):
-
-            if p.color == BLACK and p.bh == bh:
-                break;
-            p = p.right
-        return p
+        self._touch(node)
 
     def min_with_depth(self, p, cut_depth):
 
@@ -833,36 +902,130 @@ class TangoTree(BinaryTree):
         return p
 
 
-    def attach_as_max(self, n, t):
+    def black_height(self, p):
+        """
+        Returns the black height of the auxiliary (sub)tree rooted at p,
+        0 if it is empty, i.e. p is None or the root of a lower auxiliary
+        tree.
+        """
+        if is_root_or_None(p):
+            return 0
+        return p.bh
+    #end_black_height
 
-        if t is None or n is None:
-            return 
-        a = self.get_max_child(t)
-        ar = a.right
+    def _blacken(self, p):
+        """
+        Color the root of a detached auxiliary (sub)tree black so that it can
+        be used as an operand of _join(). Lower auxiliary trees hanging at a
+        leaf keep their color.
 
-        self.detach(ar, a)
-        self.attach_left(ar, n)
+        Returns:
+            The argument p.
+        """
+        if not is_root_or_None(p) and p.color == RED:
+            p.color = BLACK
+            self.update_black_height(p)
+        return p
+    #end_blacken
 
-        self.attach_right(n, a)
+    def _join(self, tl, k, tr):
+        """
+        Join two auxiliary trees with a single node in between.
 
-        self._aux_update_depths(n)
+        This is the classic black-height join of red-black trees: walk down
+        the right (left) spine of the higher tree to the first black node
+        whose black height equals the height of the other tree, replace it
+        by k with that node and the other tree as children, and repair the
+        red-red violation with the insert fixup. Only the spine part above k
+        has to be updated, so a join costs O(|bh(tl) - bh(tr)| + 1).
 
-    def attach_as_min(self, n, t):
+        Args:
+            tl: A detached auxiliary tree with keys < k.key or a leaf, i.e.
+                None or the root of a lower auxiliary tree.
+            k (TangoNode): A detached node without children.
+            tr: Like tl with keys > k.key.
 
-        if t is None or n is None:
-            return
-        a = self.get_min_child(t)
-        al = a.left
+        Returns:
+            The root of the joined auxiliary tree (unmarked).
+        """
+        lh = self.black_height(tl)
+        rh = self.black_height(tr)
+
+        if lh == rh:
+            self.attach_left(tl, k)
+            self.attach_right(tr, k)
+            k.color = BLACK
+            self.update_black_height(k)
+            k._update_depths()
+            return k
+        #endif
+
+        if lh > rh:
+            # Find the place for k on the right spine of tl.
+            # Black heights drop by at most one per black node, so we meet a
+            # black node of height rh or, if rh == 0, a leaf.
+            root = tl
+            parent = None
+            c = tl
+            while not is_root_or_None(c) and (c.bh > rh or c.color == RED):
+                parent = c
+                c = c.right
+            #endwhile
+
+            self.detach(c, parent)
+            self.attach_left(c, k)
+            self.attach_right(tr, k)
+            self.attach_right(k, parent)
+        else:
+            # symmetric: place k on the left spine of tr
+            root = tr
+            parent = None
+            c = tr
+            while not is_root_or_None(c) and (c.bh > lh or c.color == RED):
+                parent = c
+                c = c.left
+            #endwhile
+
+            self.detach(c, parent)
+            self.attach_right(c, k)
+            self.attach_left(tl, k)
+            self.attach_left(k, parent)
+        #endif
 
-        self.detach(al, a)
-        self.attach_right(al, n)
+        k.color = RED
+        self.update_black_height(k)
 
-        self.attach_left(n, a)
+        # Fix the depths on the spine above k before the fixup rotations,
+        # which then keep them up to date locally.
+        self._aux_update_depths(k)
 
-        self._aux_update_depths(n)
+        self.insert_fixup_case1(k)
+
+        # A rotation at the old root moves a spine node up.
+        while root.parent is not None:
+            root = root.parent
+
+        return root
+    #end_join
 
     def _split(self, tango_node, v_root):
+        """
+        Split the auxiliary (sub)tree rooted at v_root at tango_node.
+
+        Afterwards tango_node takes the place of v_root with all smaller keys
+        in its left and all larger keys in its right subtree. Both subtrees
+        are valid red-black trees, but their black heights usually differ,
+        so the caller has to _aux_merge() tango_node afterwards.
 
+        The walk down takes the search path apart, the walk back up joins
+        the pieces hanging off the path into the two halves. Joining bottom
+        up, each _join() costs the difference between the black heights of
+        the growing half and the next piece, which telescopes to O(log n)
+        for the whole split.
+
+        Returns:
+            tango_node
+        """
         node = tango_node
 
         v_parent = v_root.parent
@@ -875,52 +1038,49 @@ class TangoTree(BinaryTree):
         if v_mark:
             self.unmark_node(v_root)
 
+        # Walk down and take the path apart. The pieces are
+        # (k, subtree of k off the path, True if k goes to the left half).
+        pieces = []
         k = v_root
-        tl = None
-        vl = None
-        tr = None
-        vr = None
-
-        while not is_root_or_None(k):
-
+        while k is not node:
             kl = k.left
             kr = k.right
 
             self.detach(kl, k)
             self.detach(kr, k)
 
-            if kl is not None:
-                kl.color = BLACK
-                self.update_black_height(kl)
-
-            if kr is not None:
-                kr.color = BLACK
-                self.update_black_height(kr)
-
             if node.key < k.key:
-                tr = self._merge(kr, vr, tr)
-
-                vr = k
+                pieces.append((k, kr, False))
                 k = kl
-            elif node.key > k.key:
-                tl = self._merge(tl, vl, kl)
-
-                vl = k
-                k = kr
             else:
-                tl = self._merge(tl, vl, kl)
-                vl = None
-
-                tr = self._merge(kr, vr, tr)
-                vr = None
-
-                self.attach_left(tl, k)
-                self.attach_right(tr, k)
-
-                break
+                pieces.append((k, kl, True))
+                k = kr
             #endif
         #endwhile
 
+        tl = node.left
+        tr = node.right
+        self.detach(tl, node)
+        self.detach(tr, node)
+        tl = self._blacken(tl)
+        tr = self._blacken(tr)
+
+        # Walk back up and join.
+        for k, sub, to_left in reversed(pieces):
+            sub = self._blacken(sub)
+            if to_left:
+                tl = self._join(sub, k, tl)
+            else:
+                tr = self._join(tr, k, sub)
+            #endif
+        #endfor
+
+        self.attach_left(tl, node)
+        self.attach_right(tr, node)
+        node.color = BLACK
+        self.update_black_height(node)
+        node._update_depths()
+
         if v_parent is None:
             self.root = node
         else:
@@ -929,11 +1089,16 @@ class TangoTree(BinaryTree):
         if v_mark:
             self.mark_node(node)
 
-        #self.view()
         return node
+    #end_split
 
     def _aux_merge(self, n):
+        """
+        Rebalance after a _split(): join the two subtrees of n with n.
 
+        Returns:
+            The new root taking the place of n.
+        """
         np = n.parent
         nl = n.left
         nr = n.right
@@ -949,18 +1114,7 @@ class TangoTree(BinaryTree):
         self.detach(nl, n)
         self.detach(nr, n)
 
-        n.color = BLACK
-        self.update_black_height(n)
-
-        if nl is not None:
-            nl.color = BLACK
-            self.update_black_height(nl)
-
-        if nr is not None:
-            nr.color = BLACK
-            self.update_black_height(nr)
-
-        new_root = self._merge(nl, n, nr)
+        new_root = self._join(self._blacken(nl), n, self._blacken(nr))
 
         if np is None:
             self.root = new_root
@@ -971,129 +1125,7 @@ class TangoTree(BinaryTree):
             self.mark_node(new_root)
 
         return new_root
-
-    def _merge(self, nl, n, nr):
-
-        if n is None:
-
-            if nr is not None:
-                n = nr
-            elif nl is not None:
-                n = nl
-            else:
-                return
-                raise Exception("SHOULDN`T HAPPEN")
-
-        elif is_root_or_None(nl) and is_root_or_None(nr):
-
-            self.attach_left(nl, n)
-
-            self.attach_right(nr, n)
-
-            n.color = RED
-            self.update_black_height(n)
-
-        elif is_root_or_None(nl):
-
-            self.attach_as_min(n, nr)
-
-            self.attach_left(nl, n)
-
-            n.color = RED
-            self.update_black_height(n)
-        elif is_root_or_None(nr):
-
-            self.attach_as_max(n, nl)
-
-            self.attach_right(nr, n)
-
-            n.color = RED
-            self.update_black_height(n)
-        else:
-
-            lh = nl.bh
-            rh = nr.bh
-
-            if lh == rh:
-
-                self.attach_left(nl, n)
-                self.attach_right(nr, n)
-
-                n.color = RED
-            elif lh < rh:
-
-                p = self.find_min_with_bh(nr, nl.bh)
-                pp = p.parent
-
-                self.attach_left(nl, n)
-
-                self.detach(p, pp)
-
-                self.attach_right(p, n)
-
-                self.attach_left(n, pp)
-
-                self._aux_update_depths(n)
-
-                n.color = RED
-            else:
-
-                p = self.find_max_with_bh(nl, nr.bh)
-
-                pp = p.parent
-
-                self.attach_right(nr, n)
-
-                self.detach(p, pp)
-                self.attach_left(p, n)
-
-                self.attach_right(n, pp)
-                self._aux_update_depths(n)
-
-                n.color = RED
-            #endif
-        #endif
-
-        self._aux_update_depths(n)
-
-        self.insert_fixup_case1(n)
-
-        self._aux_update_bh(n)
-
-        new_root = n
-        while new_root.parent is not None:
-            new_root = new_root.parent
-
-        #self.view()
-
-        return new_root
-
-    def _cut_at(self, p):
-        top_path = p
-
-        while not top_path.is_root:
-            top_path = top_path.parent
-        cut_depth = p.depth
-        top_path = self._new_cut(top_path, cut_depth)
-
-        return top_path
-
-    def find_marked_predeccessor(self, root, key):
-        key -= 1
-        n = root
-
-        while n is not None:
-
-            if key < n.key:
-                n = n.left
-            elif key > n.key:
-                n = n.right
-            else:
-                return None
-
-            if n is not None and n.is_root:
-                return n
-        return None
+    #end_aux_merge
 
     #---------------INSERT FIXUP-----------------
     def insert_fixup_case1(self, n):
@@ -1182,6 +1214,7 @@ class TangoTree(BinaryTree):
     def rotate_left(self, n):
 
         pv = n.right
+        self._touch(n, pv, pv.left)
         pv.parent = n.parent
 
         if n.parent is None:
@@ -1205,12 +1238,15 @@ class TangoTree(BinaryTree):
             self.mark_node(n.parent)
             self.unmark_node(n)
 
-        self._aux_update_depths(n)
-        self._aux_update_depths(n.parent)
+        # The subtrees below n and pv are unchanged, so updating the two of
+        # them is enough. n is below pv now, update it first.
+        n._update_depths()
+        pv._update_depths()
 
     def rotate_right(self, n):
 
         pv = n.left
+        self._touch(n, pv, pv.right)
         pv.parent = n.parent
 
         if n.parent is None:
@@ -1234,49 +1270,10 @@ class TangoTree(BinaryTree):
             self.mark_node(n.parent)
             self.unmark_node(n)
 
-        self._aux_update_depths(n)
-        self._aux_update_depths(n.parent)
-
-    def _get_predecessor(self, p):
-        if not is_root_or_None(p.left):
-            # if left child exists go left and then all the way right
-            p = p.left
-            while not is_root_or_None(p.right):
-                p = p.right
-            return p
-
-        p_key = p.key
-        while True:
-            if self.is_root(p):
-                # Case 3: no predecessor
-                # We have to go back to p
-                p = self._aux_search(p_key, p)
-                return None
-            if p == p.parent.right:
-                return p.parent
-            else:
-                p = p.parent    # go up
-
-    def _get_successor(self, p):
-
-        if not is_root_or_None(p.right):
-            # if right child exists go right and then all the way left
-            p = p.right
-            while not is_root_or_None(p.left):
-                p = p.left
-            return p
-
-        p_key = p.key
-        while True:
-            if self.is_root(p):
-                # Case 3: no successor
-                # We have to go back to p
-                p = self._aux_search(p_key, p)
-                return None
-            if p == p.parent.left:
-                return p.parent
-            else:
-                p = p.parent    # go up
+        # The subtrees below n and pv are unchanged, so updating the two of
+        # them is enough. n is below pv now, update it first.
+        n._update_depths()
+        pv._update_depths()
 #end_TangoTree
 
 import sys
@@ -1291,6 +1288,85 @@ def node_shape(node):
         return NodeShape.circle
 
 
+class collapse_below(object):
+
+    """
+    A function for TreeView(collapse=...) drawing every auxiliary tree whose
+    top lies at depth or deeper in P, with everything below it, as one
+    summary glyph. A ParodyTree (i.e. P) is cut at depth.
+
+    A class rather than a closure so that views can be pickled.
+    """
+
+    def __init__(self, depth):
+        self.depth = depth
+
+    def __call__(self, node):
+        if isinstance(node, ParodyNode):
+            return node.original.depth >= self.depth
+        return node.is_root and node.min_depth >= self.depth
+#end_collapse_below
+
+
+def summary(node):
+    """
+    Text of the summary glyph of a node collapsed by collapse_below() or
+    left out of TangoTree.focus().
+    """
+    if isinstance(node, ParodyNode):
+        lo = hi = node
+        while lo.left is not None:
+            lo = lo.left
+        while hi.right is not None:
+            hi = hi.right
+        return 'P below depth {}: keys {}..{}'.format(
+            node.original.depth, lo.key, hi.key)
+    #endif
+
+    if not node.is_root:
+        # the rest of an auxiliary tree that is partly shown
+        return 'part of an aux tree, depth {}..{}'.format(
+            node.min_depth, node.max_depth)
+    #endif
+
+    # count the auxiliary tree along its threads
+    size = 1
+    p = node
+    while p.prev is not None:
+        p = p.prev
+        size += 1
+    p = node
+    while p.next is not None:
+        p = p.next
+        size += 1
+    return 'aux tree: {} nodes, depth {}..{}'.format(
+        size, node.min_depth, node.max_depth)
+#end_summary
+
+
+def log_profiler(tree):
+    """
+    A Profiler filling in the 'time' of the search_log entries of tree,
+    which search() and _switch() write with time 0:
+
+        with log_profiler(t).attached(t):
+            t.search(key)
+
+    Returns:
+        Profiler
+    """
+    profiler = Profiler(methods=('search', '_switch'))
+
+    def log_time(name, inclusive, exclusive, depth):
+        # the entry of the call is the last one when it returns
+        tree.search_log[-1]['time'] = inclusive
+    #end_log_time
+
+    profiler.add_callback(log_time)
+    return profiler
+#end_log_profiler
+
+
 class ParodyNode(TangoNode):
 
     def __init__(self, original):
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Per-session state for the Dash app.
+
+Every page load gets a session id (see main.serve_layout). The callbacks
+look up the state of their session in a SessionStore instead of sharing
+module globals:
+
+    sessions = SessionStore(Session, directory='/tmp/tango-sessions')
+
+    with sessions.open(session_id) as session:
+        session.tango_bst.search(4)     # saved when the block is left
+
+Without a directory the states only live in the memory of the process, so
+the app must run in a single process. Only the cache_size most recently
+used states are kept, an older session starts over with a new state.
+
+With a directory every state is also pickled to
+<directory>/<session id>.pickle after each change. A worker process
+reloads a state when the file was written by another process since it
+last saw it, so any number of workers can serve the same sessions. A lock
+file serializes the changes to one session.
+"""
+
+import collections
+import contextlib
+import os
+import pickle
+import sys
+import threading
+import time
+import uuid
+
+
+def _read_token(path):
+    """The token in the lock file at path, None if there is no lock file."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+#end_read_token
+
+
+@contextlib.contextmanager
+def _deep_recursion(limit=100000):
+    """Pickle recurses along the node pointers of the trees."""
+    old = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old, limit))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(old)
+#end_deep_recursion
+
+
+class SessionStore(object):
+
+    """
+    Args:
+        factory (function): () -> the state of a new session.
+        directory (str, optional): Directory shared by all workers for the
+            pickled states, default None (memory only).
+        cache_size (int, optional): Number of states kept in memory, default
+            64. The least recently used ones are dropped, with a directory
+            they are reloaded from their files.
+        lock_timeout (float, optional): Seconds after which the lock file
+            of a crashed worker is broken, default 60.
+    """
+
+    def __init__(self, factory, directory=None, cache_size=64,
+                 lock_timeout=60):
+        self.factory = factory
+        self.directory = directory
+        self.cache_size = cache_size
+        self.lock_timeout = lock_timeout
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        # session id -> (file stamp, state), least recently used first
+        self._cache = collections.OrderedDict()
+        # session id -> [threading.Lock, number of threads using it], only
+        # for the sessions in use
+        self._locks = {}
+        self._guard = threading.Lock()   # guards _cache and _locks
+    #end_init
+
+    @contextlib.contextmanager
+    def open(self, session_id):
+        """
+        Context manager yielding the state of session_id (a new one for an
+        unknown id) and saving it when the block is left without an error.
+        Other callbacks of the same session wait until then.
+
+        Raises:
+            ValueError: If session_id is not a uuid.
+        """
+        session_id = str(uuid.UUID(session_id))
+        with self._thread_lock(session_id), self._file_lock(session_id):
+            state = self._load(session_id)
+            yield state
+            self._save(session_id, state)
+        #endwith
+    #end_open
+
+    @contextlib.contextmanager
+    def read(self, session_id):
+        """
+        Like open, but the state is only read and not saved. The changes of
+        other callbacks of the same session still wait until the block is
+        left, so the state does not change while it is read.
+
+        Raises:
+            ValueError: If session_id is not a uuid.
+        """
+        session_id = str(uuid.UUID(session_id))
+        with self._thread_lock(session_id), self._file_lock(session_id):
+            yield self._load(session_id)
+        #endwith
+    #end_read
+
+    @contextlib.contextmanager
+    def _thread_lock(self, session_id):
+        with self._guard:
+            entry = self._locks.get(session_id)
+            if entry is None:
+                entry = self._locks[session_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        #endwith
+
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[session_id]
+            #endwith
+        #endtry
+    #end_thread_lock
+
+    def _path(self, session_id, suffix):
+        return os.path.join(self.directory, session_id + suffix)
+
+    @contextlib.contextmanager
+    def _file_lock(self, session_id):
+        if self.directory is None:
+            yield
+            return
+        #endif
+
+        # The lock file holds the token of its owner. A worker that was
+        # slower than lock_timeout may have lost its lock to a stale lock
+        # break, it must not remove the lock file of the next owner then.
+        path = self._path(session_id, '.lock')
+        token = '{}-{}'.format(os.getpid(), uuid.uuid4().hex).encode()
+        while True:
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                try:
+                    age = time.time() - os.path.getmtime(path)
+                    if age > self.lock_timeout:
+                        os.remove(path)
+                except OSError:
+                    pass
+                time.sleep(0.01)
+            #endtry
+        #endwhile
+
+        try:
+            os.write(fd, token)
+        finally:
+            os.close(fd)
+        #endtry
+
+        try:
+            yield
+        finally:
+            if _read_token(path) == token:
+                os.remove(path)
+        #endtry
+    #end_file_lock
+
+    def _stamp(self, session_id):
+        """The version of the pickled state, None if there is none."""
+        try:
+            stat = os.stat(self._path(session_id, '.pickle'))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    #end_stamp
+
+    def _load(self, session_id):
+        stamp = None
+        if self.directory is not None:
+            stamp = self._stamp(session_id)
+
+        with self._guard:
+            cached = self._cache.get(session_id)
+            if cached is not None and cached[0] == stamp:
+                self._cache.move_to_end(session_id)
+                return cached[1]
+            #endif
+        #endwith
+
+        if stamp is not None:
+            with open(self._path(session_id, '.pickle'), 'rb') as f, \
+                    _deep_recursion():
+                state = pickle.load(f)
+        else:
+            state = self.factory()
+        #endif
+
+        self._remember(session_id, stamp, state)
+        return state
+    #end_load
+
+    def _save(self, session_id, state):
+        stamp = None
+        if self.directory is not None:
+            path = self._path(session_id, '.pickle')
+            with open(path + '.tmp', 'wb') as f, _deep_recursion():
+                pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.tmp', path)
+            stamp = self._stamp(session_id)
+        #endif
+        self._remember(session_id, stamp, state)
+    #end_save
+
+    def _remember(self, session_id, stamp, state):
+        with self._guard:
+            self._cache[session_id] = (stamp, state)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_size:
+                # least recently used first, a session in use stays
+                victim = next((old for old in self._cache
+                               if old not in self._locks), None)
+                if victim is None:
+                    break
+                del self._cache[victim]
+            #endwhile
+        #endwith
+    #end_remember
+#end_SessionStore
@@ -278,9 +278,12 @@ tango_view = treeview.TreeView(tango_bst,
                   node_shape=tg.node_shape, plot_bg=colors['black-grey'])
 naive_view = treeview.TreeView(tree=naive_bst, layout_algorithm=SimpleBinaryTreeLayout, plot_bg=colors['black-grey'])
 
+naive_view.view()
+tango_view.view()
+
 figures = {
-    'Perfectly balanced binary search tree' : dict(data=naive_view.view(), layout=naive_view.create_layout()),
-    'Auxilary trees' : dict(data=tango_view.view(), layout=tango_view.create_layout())
+    'Perfectly balanced binary search tree' : dict(data=naive_view.figure(), layout=naive_view.create_layout()),
+    'Auxilary trees' : dict(data=tango_view.figure(), layout=tango_view.create_layout())
     }
 
 #-----------------------------------------------------------------------------------------------------------------
@@ -347,8 +350,10 @@ def build_tree(keys):
                   node_shape=tg.node_shape, plot_bg=colors['black-grey'])
     naive_bst = tango_bst.parody
     naive_view = treeview.TreeView(tree=naive_bst, layout_algorithm=SimpleBinaryTreeLayout, plot_bg=colors['black-grey'])
-    figures['Auxilary trees'] = dict(data=tango_view.view(), layout=tango_view.create_layout())
-    figures['Perfectly balanced binary search tree']['data'] = dict(data=naive_view.view(), layout=naive_view.create_layout())
+    tango_view.view()
+    naive_view.view()
+    figures['Auxilary trees'] = dict(data=tango_view.figure(), layout=tango_view.create_layout())
+    figures['Perfectly balanced binary search tree']['data'] = dict(data=naive_view.figure(), layout=naive_view.create_layout())
 
 clicks = {
     'search' : None,
@@ -407,11 +412,13 @@ def search_update(n_clicks, checked, value):
         elif 'step' in checked:
             tango_bst.step = True
         value = validate(value.split(','))
-        for i in value:
-            tango_bst.search(i)
-            if 'vis' in checked:
-                tango_view.view()
-                naive_bst.view()
+        with tg.log_profiler(tango_bst).attached(tango_bst):
+            for i in value:
+                tango_bst.search(i)
+                if 'vis' in checked:
+                    tango_view.view()
+                    naive_bst.view()
+        #endwith
     tango_view.current_snapshot_index = prev_snapshot_t
     naive_view.current_snapshot_index = prev_snapshot_n
     #figures['Auxilary trees']['data'] = tango_view.view()
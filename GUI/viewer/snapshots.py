@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Delta-encoded snapshot history for the TreeView.
+
+A snapshot maps every node of the tree to an entry
+(position, node.__dict__ copy, attributes, shape). Between two views of a
+search only a few nodes change, so storing every snapshot in full costs
+O(k*n) for k views of an n-node tree.
+
+SnapshotHistory stores a snapshot as the entries that differ from the
+previous one (compared by identity, TreeView reuses unchanged entries)
+plus the removed nodes. Every keyframe_interval-th snapshot is stored as
+a full node dict, so any snapshot can be rebuilt from the last keyframe
+with at most keyframe_interval - 1 deltas. A full node dict shares the
+entries with the other snapshots, it only costs one reference per node.
+
+Only the newest capacity snapshots (rounded up to whole keyframe blocks)
+are kept in memory. Older blocks are pickled, compressed with zlib and
+appended to a spill file, from where they are reloaded when the user steps
+back to them. Nodes and all other objects in a snapshot that are not plain
+values (numbers, strings, containers) are written as a uid and resolved to
+the same live object on reloading, so a reloaded snapshot is equal to the
+one appended.
+"""
+
+import io
+import pickle
+import tempfile
+import zlib
+
+
+class _Removed(object):
+
+    """Marks a node missing from a snapshot in a delta."""
+
+    def __reduce__(self):
+        # stays the one instance when a history is pickled
+        return '_REMOVED'
+#end_Removed
+
+
+_REMOVED = _Removed()
+
+# Written into the spill file by value, everything else by reference.
+_PLAIN = (type(None), bool, int, float, complex, str, bytes,
+          tuple, list, dict, set, frozenset)
+
+
+class _Pickler(pickle.Pickler):
+
+    def __init__(self, file, history):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.history = history
+
+    def persistent_id(self, obj):
+        if type(obj) in _PLAIN:
+            return None
+        return self.history._uid(obj)
+#end_Pickler
+
+
+class _Unpickler(pickle.Unpickler):
+
+    def __init__(self, file, history):
+        super().__init__(file)
+        self.history = history
+
+    def persistent_load(self, uid):
+        return self.history._refs[uid]
+#end_Unpickler
+
+
+class SnapshotHistory(object):
+
+    """
+    A list-like, append-only sequence of snapshots.
+
+    Indexing returns the snapshot dict as it was appended. The returned
+    dicts must not be modified.
+
+    Args:
+        keyframe_interval (int, optional): Every this many snapshots one is
+            stored in full, default 32.
+        capacity (int, optional): Number of snapshots kept in memory, at
+            least 1, default 256. None keeps all of them in memory.
+        spill_file (file, optional): A binary file opened for reading and
+            writing to spill older snapshots to, default a temporary file
+            created on the first spill.
+    """
+
+    def __init__(self, keyframe_interval=32, capacity=256, spill_file=None):
+        self.keyframe_interval = keyframe_interval
+        self.capacity = capacity
+        self.spill_file = spill_file
+
+        # per snapshot: (full node dict or None, delta or None, meta dict)
+        # where meta holds every key of the snapshot except 'nodes'
+        self._records = []       # the records of the snapshots _first..
+        self._first = 0          # index of the first record in memory
+        self._spilled = []       # (offset, size) per spilled block
+        self._loaded = None      # (block, records) of the last reloaded
+        self._refs = []          # uid -> object for the spill file
+        self._uids = {}          # id(object) -> uid
+
+        self._head = None        # the newest snapshot in full
+        self._cached = None      # (index, nodes) of the last rebuilt one
+    #end__init__
+
+    def __len__(self):
+        return self._first + len(self._records)
+
+    def __getstate__(self):
+        # The spill file travels as bytes, the uids of the references are
+        # ids of this process.
+        state = self.__dict__.copy()
+        state['spill_file'] = None
+        state['_spill_data'] = None
+        if self.spill_file is not None:
+            self.spill_file.seek(0)
+            state['_spill_data'] = self.spill_file.read()
+        #endif
+        state['_uids'] = None
+        state['_loaded'] = None
+        state['_cached'] = None
+        return state
+    #end_getstate
+
+    def __setstate__(self, state):
+        data = state.pop('_spill_data')
+        self.__dict__.update(state)
+        if data is not None:
+            self.spill_file = tempfile.TemporaryFile()
+            self.spill_file.write(data)
+        #endif
+        self._uids = {id(obj): uid for uid, obj in enumerate(self._refs)}
+    #end_setstate
+
+    @property
+    def head(self):
+        """The newest snapshot or None."""
+        return self._head
+
+    def append(self, snapshot):
+        nodes = snapshot['nodes']
+        meta = {key: value for key, value in snapshot.items()
+                if key != 'nodes'}
+        index = len(self)
+
+        if index % self.keyframe_interval == 0:
+            self._records.append((nodes, None, meta))
+        else:
+            old = self._head['nodes']
+            delta = {}
+            for node, entry in nodes.items():
+                if old.get(node) is not entry:
+                    delta[node] = entry
+            #endfor
+            for node in old:
+                if node not in nodes:
+                    delta[node] = _REMOVED
+            #endfor
+            self._records.append((None, delta, meta))
+        #endif
+
+        self._head = snapshot
+
+        if self.capacity is not None:
+            while len(self._records) - self.keyframe_interval >= self.capacity:
+                self._spill()
+        #endif
+    #end_append
+
+    def _spill(self):
+        """Move the oldest block of records in memory to the spill file."""
+        block = self._records[:self.keyframe_interval]
+        del self._records[:self.keyframe_interval]
+        self._first += self.keyframe_interval
+
+        buffer = io.BytesIO()
+        _Pickler(buffer, self).dump(block)
+        data = zlib.compress(buffer.getvalue())
+
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+        self.spill_file.seek(0, io.SEEK_END)
+        self._spilled.append((self.spill_file.tell(), len(data)))
+        self.spill_file.write(data)
+    #end_spill
+
+    def _uid(self, obj):
+        uid = self._uids.get(id(obj))
+        if uid is None:
+            # _refs keeps obj alive, so its id is not reused
+            uid = len(self._refs)
+            self._uids[id(obj)] = uid
+            self._refs.append(obj)
+        #endif
+        return uid
+    #end_uid
+
+    def _record(self, index):
+        """The record of snapshot index, reloaded if it was spilled."""
+        if index >= self._first:
+            return self._records[index - self._first]
+
+        block = index // self.keyframe_interval
+        if self._loaded is None or self._loaded[0] != block:
+            offset, size = self._spilled[block]
+            self.spill_file.seek(offset)
+            data = zlib.decompress(self.spill_file.read(size))
+            self._loaded = (block, _Unpickler(io.BytesIO(data), self).load())
+        #endif
+        return self._loaded[1][index % self.keyframe_interval]
+    #end_record
+
+    def __getitem__(self, index):
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError('snapshot index out of range')
+
+        if index == n - 1:
+            return self._head
+
+        full, _, meta = self._record(index)
+        snapshot = dict(meta)
+        snapshot['nodes'] = full if full is not None else self._rebuild(index)
+        return snapshot
+    #end_getitem
+
+    def _rebuild(self, index):
+        keyframe = index - index % self.keyframe_interval
+
+        # Continue from the last rebuilt snapshot if it is on the way.
+        if self._cached is not None and keyframe < self._cached[0] <= index:
+            start, nodes = self._cached
+        else:
+            start, nodes = keyframe, self._record(keyframe)[0]
+        #endif
+
+        nodes = dict(nodes)
+        for i in range(start + 1, index + 1):
+            for node, entry in self._record(i)[1].items():
+                if entry is _REMOVED:
+                    del nodes[node]
+                else:
+                    nodes[node] = entry
+            #endfor
+        #endfor
+
+        self._cached = (index, nodes)
+        return nodes
+    #end_rebuild
+#end_SnapshotHistory
@@ -9,8 +9,72 @@ sys.path.insert(1, '../util/')
 
 """
 This module defines some (binary) tree layout algorithms.
+
+The tree is flattened once into arrays (in-order or pre-order) by an
+iterative traversal; the coordinates of all nodes are then computed with
+NumPy array operations.
 """
 
+import numpy as np
+
+
+def _inorder(root, collapsed=()):
+    """
+    Returns:
+        (nodes, depths): the nodes below root in in-order and their depths.
+        The subtrees of collapsed nodes are left out (but not the collapsed
+        nodes themselves).
+    """
+    nodes = []
+    depths = []
+    stack = []
+    p, depth = root, 0
+    while stack or p is not None:
+        while p is not None:
+            stack.append((p, depth))
+            p = p.left if p not in collapsed else None
+            depth += 1
+        #endwhile
+        p, depth = stack.pop()
+        nodes.append(p)
+        depths.append(depth)
+        p = p.right if p not in collapsed else None
+        depth += 1
+    #endwhile
+    return nodes, depths
+#end_inorder
+
+
+def _preorder(root, collapsed=()):
+    """
+    Returns:
+        (nodes, parents, depths, is_left): the nodes below root in
+        pre-order, the index of their parent in nodes (-1 for root), their
+        depths and whether they are a left child. The subtrees of collapsed
+        nodes are left out.
+    """
+    nodes = []
+    parents = []
+    depths = []
+    is_left = []
+    stack = [(root, -1, 0, False)]
+    while stack:
+        p, parent, depth, left = stack.pop()
+        i = len(nodes)
+        nodes.append(p)
+        parents.append(parent)
+        depths.append(depth)
+        is_left.append(left)
+        if p in collapsed:
+            continue
+        if p.right is not None:
+            stack.append((p.right, i, depth + 1, False))
+        if p.left is not None:
+            stack.append((p.left, i, depth + 1, True))
+    #endwhile
+    return nodes, parents, depths, is_left
+#end_preorder
+
 
 class SimpleBinaryTreeLayout():
 
@@ -39,59 +103,55 @@ class SimpleBinaryTreeLayout():
         self.node_radius = 0
     #end_init
 
-    def layout(self, tree):
+    def layout(self, tree, collapsed=()):
         """
         Layout a binary tree, i.e. calculate the position of each node in
         the viewport where the origin is in the top left.
 
         Args:
             tree (BinaryTree): the tree to layout.
+            collapsed (set, optional): nodes drawn without their subtrees.
 
         Returns:
             dict: node -> (x, y) tuple of double - the coordinates of the
                   center of the node.
         """
-        pos = {}
-        margin = self.margin + self.node_radius
-
-        if tree.root:
-            width = self.width - 2 * margin
-            height = self.height - 2 * margin
-
-            # the root is displayed at the top center
-            y_0 = margin + height
-            x_0 = margin + width/2
-            pos[tree.root] = (x_0, y_0)
-
-            # vertical spacing
-            tree_depth = tree.height()
-            dy = height / tree_depth if tree_depth != 0 else 0
-
-            # horizontal spacing
-            def dx(depth):
-                """Returns horizontal spacing for given level:"""
-                return (width / 2) / (2 ** depth)
-
-            def pos_from_parent(node, depth, parent_pos):
-                """Recursive helper to calculate position based on parent and
-                depth."""
-                if node:
-                    y = y_0 - depth * dy
-
-                    if node == node.parent.left:
-                        x = parent_pos[0] - dx(depth)
-                    else:
-                        x = parent_pos[0] + dx(depth)
-
-                    pos[node] = (x, y)
-
-                    pos_from_parent(node.left, depth+1, (x, y))
-                    pos_from_parent(node.right, depth+1, (x, y))
-            #end_pos_from_parent
-            pos_from_parent(tree.root.left, 1, (x_0, y_0))
-            pos_from_parent(tree.root.right, 1, (x_0, y_0))
-        #endif
+        if not tree.root:
+            return {}
 
+        margin = self.margin + self.node_radius
+        width = self.width - 2 * margin
+        height = self.height - 2 * margin
+
+        nodes, parents, depths, is_left = _preorder(tree.root, collapsed)
+        parents = np.array(parents)
+        depths = np.array(depths)
+
+        # the root is displayed at the top center
+        y_0 = margin + height
+        x_0 = margin + width/2
+
+        # vertical spacing
+        tree_depth = depths.max()
+        dy = height / tree_depth if tree_depth != 0 else 0
+        y = y_0 - depths * dy
+
+        # horizontal spacing: (width / 2) / (2 ** depth) to the left or the
+        # right of the parent
+        dx = (width / 2) / np.exp2(depths)
+        dx[np.array(is_left)] *= -1
+
+        # x = x(parent) + dx, one level after the other
+        x = np.empty(len(nodes))
+        x[0] = x_0
+        order = np.argsort(depths, kind='stable')
+        bounds = np.searchsorted(depths[order], np.arange(tree_depth + 2))
+        for level in range(1, tree_depth + 1):
+            idx = order[bounds[level]:bounds[level + 1]]
+            x[idx] = x[parents[idx]] + dx[idx]
+        #endfor
+
+        pos = dict(zip(nodes, zip(x.tolist(), y.tolist())))
         return pos
     #end_layout
 
@@ -120,111 +180,49 @@ class SpaceEfficientBinaryTreeLayout():
     #end_init
 
 
-    def layout(self, tree):
+    def layout(self, tree, collapsed=()):
         """
         Layout a binary tree, i.e. calculate the position of each node in
         the viewport where the origin is in the top left.
 
         Args:
             tree (BinaryTree): the tree to layout.
+            collapsed (set, optional): nodes drawn without their subtrees.
 
         Returns:
             dict: node -> (x, y) tuple of double - the coordinates of the
                   center of the node.
         """
-        pos = {}
-
         if tree.root is None:
-            return pos
-
-        # We use virtual coordinates and dimensions since we do not know in
-        # advance how big the tree is. After the layout process we
-        # transform these coordinates to match the viewport. To do that we
-        # keep track of the minimal and maximal used coordinates.
-
-        # Pass 1: Layouting using virtual coordinates.
-        x_0, y_0 = 0, 0
-        d = 1
-
-        def _layout_subtree(p, x_0, y_0):
-            """
-            Sets the virtual position off all nodes in the subtree rooted
-            at p where (x_0, y_0) are the coordinates of the
-            top-left corner of the region allocated for this subtree.
-
-            Returns the required width and height of this region.
-            """
-
-            # Case 1: Empty.
-            if p is None:
-                # No space required.
-                return 0, 0
-
-            # Case 2: Leaf.
-            elif p.left is None and p.right is None:
-                pos[p] = x_0, y_0
-                # Spacing is managed by parents.
-                return 0, 0
-            #endif
-
-            # Case 3: Has child(ren).
-            left_width, left_height = _layout_subtree(
-                p.left,
-                x_0,
-                y_0 + d)
-
-            if p.left is None:
-                # we do not need d/2 spacing
-                x = x_0
-            else:
-                x = x_0 + left_width + d/2
-            #endif
-
-            pos[p] = (x, y_0)
-
-            right_width, right_height = _layout_subtree(
-                p.right,
-                x + d/2,
-                y_0 + d)
-
-            # required_width = left_width + d + right_width
-            required_width = left_width + right_width
-            if p.left is not None:
-                required_width += d/2
-            if p.right is not None:
-                required_width += d/2
-
-            required_height = max(left_height, right_height) + d
-
-            return required_width, required_height
-        #end_layout_subtree
-
-        total_width, total_height = _layout_subtree(tree.root, x_0, y_0)
-
-        # Pass 2: scaling
-        # map 0, 0 to margin, margin
-        # and total_width, total_height to width - margin, height - margin
-        if total_width == 0 and total_height == 0:
+            return {}
+
+        # A subtree of size s is given a region of width (s - 1) * d/2 and
+        # its root is placed d/2 right of its left subtree, so the virtual x
+        # of a node is d/2 times its in-order rank and the virtual y is d
+        # times its depth. Both are then scaled to the viewport.
+        nodes, depths = _inorder(tree.root, collapsed)
+        depths = np.array(depths)
+        total_height = depths.max()
+
+        if len(nodes) == 1:
             # there is only the root node
-            pos[tree.root] = (self.width/2, self.margin + self.height)
-        else:
-            viewport_width = self.width - 2 * self.margin
-            viewport_height = self.height - 2 * self.margin
-
-            scale_x = viewport_width / total_width
-            scale_y = viewport_height / total_height
-
-            for node, (x, y) in pos.items():
-                x = x * scale_x + self.margin
-                y = y * scale_y + self.margin
-                pos[node] = (x, self.height - y)
-            #endfor
+            return {tree.root: (self.width/2, self.margin + self.height)}
         #endif
 
+        viewport_width = self.width - 2 * self.margin
+        viewport_height = self.height - 2 * self.margin
+
+        x = np.arange(len(nodes)) * (viewport_width / (len(nodes) - 1)) \
+            + self.margin
+        y = self.height - (depths * (viewport_height / total_height)
+                           + self.margin)
+
+        pos = dict(zip(nodes, zip(x.tolist(), y.tolist())))
         return pos
     #end_layout
 #end_SpaceEfficientBinaryTreeLayout
 
+
 def show_layout(layout, keys):
     from naive import NaiveBST
     from treeview import TreeView
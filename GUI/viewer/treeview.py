@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 #---------------Views--------------
 from viewer.treelayout import SpaceEfficientBinaryTreeLayout
+from viewer.snapshots import SnapshotHistory
 #---------------\Views-------------
 
 #-----------DASH Modules-----------
@@ -21,15 +22,29 @@ import sys
 import time
 import functools
 import types
+import threading
+import itertools
+import collections
 from enum import Enum
 #--------------\Rest---------------
 
 class NodeShape(Enum):
     circle = 1
     square = 2
+    summary = 3     # a collapsed subtree, see TreeView(collapse=...)
 #end_NodeShape
 
 
+def circle_shape(node):
+    """The default shape of a node."""
+    return NodeShape.circle
+
+
+def key_summary(node):
+    """The default text of a summary glyph."""
+    return str(node.key)
+
+
 class Viewable(object):
 
     """
@@ -78,6 +93,23 @@ class TreeView(object):
         font_size (int, optional): font_size of node labels in pt, default 12.
         animation (bool, optional): animate between tree snapshots,
             default True.
+        history_size (int, optional): number of snapshots kept in memory,
+            older ones are spilled to a temporary file, default 256.
+            None keeps all of them in memory.
+        figure_cache_size (int, optional): number of figures kept, the
+            least recently shown are dropped and built again on demand,
+            default 32.
+        prefetch (int, optional): number of figures after the shown one
+            built ahead in a background thread, default 2.
+        collapse (function, optional): a function (node) -> bool, True if
+            the subtree of node should be drawn as a single summary glyph
+            until the glyph is clicked (see expand()), default None.
+        summary (function, optional): a function (node) -> str giving the
+            text of the summary glyph of a collapsed node, default the key.
+        focus (function, optional): a function () -> iterable of nodes. If
+            given only these nodes, their ancestors and the expanded nodes
+            are drawn, the other children of drawn nodes become summary
+            glyphs and collapse is ignored, default None.
 
     Example:
         create a binary search tree
@@ -105,7 +137,13 @@ class TreeView(object):
                  layout_algorithm=None,
                  animation=False,
                  border=10,
-                 plot_bg='rgb(0, 0, 0)'
+                 plot_bg='rgb(0, 0, 0)',
+                 history_size=256,
+                 figure_cache_size=32,
+                 prefetch=2,
+                 collapse=None,
+                 summary=None,
+                 focus=None
                  ):
 
         self.node_attribute_names = node_attributes if node_attributes else []
@@ -120,7 +158,7 @@ class TreeView(object):
         if node_shape is not None:
             self.node_shape = node_shape
         else:
-            self.node_shape = lambda n: NodeShape.circle
+            self.node_shape = circle_shape
         #endif
 
         self.font = None
@@ -134,7 +172,16 @@ class TreeView(object):
             self.layout_algorithm = SpaceEfficientBinaryTreeLayout
         #endif
 
+        # one layout object for all snapshots
+        self.tree_layout = self.layout_algorithm(width=self.width, height=self.height, margin=2*self.node_radius)
+
         self.animation = animation
+
+        # level of detail: collapsed subtrees are neither laid out nor saved
+        self.collapse = collapse
+        self.focus = focus
+        self.summary = summary if summary is not None else key_summary
+        self.expanded = set()    # collapsed nodes the user expanded
         self.end_pause = False   # controls the display loop
         self.redraw = False      # set to True if redraw is needed
 
@@ -145,12 +192,22 @@ class TreeView(object):
         #   - 'info': the kwargs passed to view(..), e.g. the current method of
         #       the alg
         # The display position of the nodes is saved for animation.
+        # The history stores only the entries changed since the previous
+        # snapshot and spills old snapshots to disk (see viewer.snapshots).
         # TODO do we need an initial snapshot?
 
+        # Figures are built when a snapshot is shown and kept in an LRU
+        # cache {snapshot index: figure data}. The lock guards snapshots and
+        # figures against the prefetch thread.
+
         self.current_snapshot_index = 0
-        self.figures = []
-        self.snapshots = [self._create_snapshot()]
-        # TODO (low priority) do incremental versions :)
+        self.figures = collections.OrderedDict()
+        self.figure_cache_size = figure_cache_size
+        self.prefetch = prefetch
+        self._prefetcher = None
+        self._lock = threading.RLock()
+        self.snapshots = SnapshotHistory(capacity=history_size)
+        self.snapshots.append(self._create_snapshot())
 
         # provide self.view(**kwargs)
         #print(self.tree)
@@ -165,6 +222,30 @@ class TreeView(object):
     #end_init
 
 
+    def __getstate__(self):
+        # Figures are rebuilt on demand, locks and threads do not pickle.
+        # The snapshots (and their spill file) are pickled after this
+        # returns, so the prefetch thread must be done with them. Only
+        # figure() starts it, never while the view is being pickled.
+        prefetcher = self._prefetcher
+        if prefetcher is not None:
+            prefetcher.join()
+        with self._lock:
+            state = self.__dict__.copy()
+        #endwith
+        state['figures'] = collections.OrderedDict()
+        state['_prefetcher'] = None
+        del state['_lock']
+        return state
+    #end_getstate
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+    #end_setstate
+
+
     def continue_callback(self, event=None):
         self.end_pause = True   # exit the event loop
 
@@ -181,6 +262,28 @@ class TreeView(object):
         pass
 
 
+    def expand(self, key):
+        """Draw the collapsed node with key of the current snapshot from now
+        on, with collapse its whole subtree, with focus the node itself and
+        its children as glyphs. The current state of the tree is viewed
+        again with the node expanded.
+
+        Returns:
+            The figure data of the current snapshot.
+        """
+        with self._lock:
+            collapsed = self.snapshots[self.current_snapshot_index]['collapsed']
+            for node in collapsed:
+                if node.key == key:
+                    self.expanded.add(node)
+                    self.view(expanded=key)
+                    break
+            #endfor
+            return self.figure()
+        #endwith
+    #end_expand
+
+
     """
     Returns the new snapshot (status of the tree) after update
     """
@@ -191,22 +294,69 @@ class TreeView(object):
             'root': self.tree.root,
             'width': self.width,        # canvas dimensions for scaling
             'height': self.height,
-            'info': {}
+            'info': {},
+            'collapsed': {}             # node -> summary text
         }
 
+        collapsed = snapshot['collapsed']
+        if self.focus is not None and self.tree.root is not None:
+            # focus and context: the focus with its ancestors, the rest is
+            # collapsed at the first node off this set
+            visible = set()
+            for node in itertools.chain(self.focus(), self.expanded):
+                while node is not None and node not in visible:
+                    visible.add(node)
+                    node = node.parent
+                #endwhile
+            #endfor
+            for node in visible:
+                for child in (node.left, node.right):
+                    if child is not None and child not in visible:
+                        collapsed[child] = self.summary(child)
+                #endfor
+            #endfor
+        elif self.collapse is not None and self.tree.root is not None:
+            stack = [self.tree.root]
+            while stack:
+                node = stack.pop()
+                if node not in self.expanded and self.collapse(node):
+                    collapsed[node] = self.summary(node)
+                    continue
+                #endif
+                for child in (node.left, node.right):
+                    if child is not None:
+                        stack.append(child)
+            #endwhile
+        #endif
+
         # calculate the position in viewport
         #print(self.layout_algorithm)
-        viewer_obj = self.layout_algorithm(width=self.width, height=self.height, margin=2*self.node_radius)
-        pos = viewer_obj.layout(self.tree)
+        if collapsed:
+            pos = self.tree_layout.layout(self.tree, collapsed)
+        else:
+            pos = self.tree_layout.layout(self.tree)
+
+        # entries of the previous snapshot, reused if nothing changed
+        previous = self.snapshots.head['nodes'] if len(self.snapshots) else {}
 
         for node, position in pos.items():
             # save other attributes
-            snapshot['nodes'][node] = (
-                position,
-                node.__dict__.copy(),
-                [getattr(node, name) for name in self.node_attribute_names],
-                self.node_shape(node)
-            )
+            attrs = [getattr(node, name) for name in self.node_attribute_names]
+            shape = self.node_shape(node) if node not in collapsed \
+                else NodeShape.summary
+            entry = previous.get(node)
+            if entry is not None and entry[0] == position \
+                    and entry[1] == node.__dict__ \
+                    and entry[2] == attrs and entry[3] is shape:
+                snapshot['nodes'][node] = entry
+            else:
+                snapshot['nodes'][node] = (
+                    position,
+                    node.__dict__.copy(),
+                    attrs,
+                    shape
+                )
+            #endif
         #endfor
 
         return snapshot
@@ -230,27 +380,6 @@ class TreeView(object):
         self.small_font = ('Verdana', font_size // 2)
 
 
-    """
-    Creates annotations list for the tree nodes
-    """
-    def make_annotations(self, font_size=20, font_color='rgb(250,250,250)'):
-
-        annotations = dict() #go.Annotations()
-        nodes = self.snapshots[self.current_snapshot_index]['nodes']
-
-        for node, value in nodes.items():
-            annotations[node] = go.Annotation(
-                        text=node.key, # or replace labels with a different list for the text within the circle 
-                        x=value[0][0], y=value[0][1],
-                        xref='x1', yref='y1',
-                        font=dict(color=font_color, size=font_size),
-                        showarrow=False
-                    )
-        #endfor
-
-        return annotations
-    #end_make_annotations
-
     def create_layout(self):
         layout = dict(#title= 'Tree Layout Algorithm',  
                     showlegend=False,
@@ -280,18 +409,18 @@ class TreeView(object):
 
 
     def view(self, **kwargs):
-        """View the current state of the tree and save it to the history.
+        """Save the current state of the tree to the history and make it the
+        current snapshot. Its figure is built by figure() when needed.
 
         Kwargs:
             highlight (iterable of Node): some nodes to be highlighted.
         """
-        snapshot = self._create_snapshot()
-        snapshot['info'] = kwargs
-        self.snapshots.append(snapshot)
-
-        # display the new snapshot and enter the event loop
-        # start = time.time()
-        return self._view(len(self.snapshots) - 1)
+        with self._lock:
+            snapshot = self._create_snapshot()
+            snapshot['info'] = kwargs
+            self.snapshots.append(snapshot)
+            self.current_snapshot_index = len(self.snapshots) - 1
+        #endwith
     #end_view    
 
         #self._pause_until_continue()
@@ -303,25 +432,172 @@ class TreeView(object):
    
 
     def _view(self, new_snapshot_index=None):
-        
-        if new_snapshot_index is None:
-            # redraw
-            new_snapshot_index = self.current_snapshot_index
-            return self.figures[self.current_snapshot_index - 1]
-        elif new_snapshot_index - 1 < len(self.figures) and new_snapshot_index > 0:
-            self.current_snapshot_index = new_snapshot_index
-            return self.figures[self.current_snapshot_index - 1]
-        elif new_snapshot_index == self.current_snapshot_index \
-                or new_snapshot_index <= 0 \
-                or new_snapshot_index >= len(self.snapshots):
-            # nothing new
-            return self.figures[self.current_snapshot_index - 1]
+        """Make new_snapshot_index the current snapshot if it exists.
 
-        #endif
+        Returns:
+            The figure data of the current snapshot.
+        """
+        with self._lock:
+            if new_snapshot_index is not None \
+                    and 0 < new_snapshot_index < len(self.snapshots):
+                self.current_snapshot_index = new_snapshot_index
+            #endif
+            return self.figure()
+        #endwith
+    #end_view
+
+
+    def figure(self, index=None):
+        """The figure data of snapshot index, default the current one.
+
+        Figures come from the LRU cache or are built on demand. The next
+        prefetch figures are then built in a background thread.
+        """
+        with self._lock:
+            if index is None:
+                index = self.current_snapshot_index
+            figure = self._cached_figure(index)
+        #endwith
+        self._prefetch(index)
+        return figure
+    #end_figure
+
+
+    def _cached_figure(self, index):
+        with self._lock:
+            figure = self.figures.get(index)
+            if figure is not None:
+                self.figures.move_to_end(index)
+                return figure
+            #endif
 
-        old_snapshot = self.snapshots[self.current_snapshot_index]
+            figure = self._create_figure(index)
+            self.figures[index] = figure
+            if len(self.figures) > self.figure_cache_size:
+                self.figures.popitem(last=False)
+            return figure
+        #endwith
+    #end_cached_figure
+
+
+    def create_animation(self, start=0, stop=None, duration=1000, frames=True):
+        """Plotly frames of the snapshots start..stop-1 and the controls to
+        play them in the browser, without a request per step.
+
+        The frames are built directly, not through the figure cache, so
+        they do not evict the figures of the snapshots being stepped
+        through.
+
+        Args:
+            start (int, optional): The first snapshot, default 0.
+            stop (int, optional): End of the range, default all snapshots.
+            duration (float, optional): Milliseconds per frame until the
+                speed is changed in the figure, default 1000.
+            frames (bool, optional): False to get only the controls, for a
+                figure whose frames the browser already has, default True.
+
+        Returns:
+            (frames, controls): The 'frames' of the figure (None if not
+            requested) and a dict with the 'updatemenus', 'sliders' and the
+            'margin' to update its layout with.
+        """
+        with self._lock:
+            if stop is None:
+                stop = len(self.snapshots)
+            if frames:
+                frames = [dict(name=str(i), data=self._create_figure(i))
+                          for i in range(start, stop)]
+            else:
+                frames = None
+            #endif
+            active = min(max(self.current_snapshot_index - start, 0), stop - start - 1)
+        #endwith
+
+        def play(duration):
+            # scattergl traces are not tweened, every frame is redrawn
+            return dict(frame=dict(duration=duration, redraw=True),
+                        transition=dict(duration=0),
+                        fromcurrent=True, mode='immediate')
+        #end_play
+
+        font = dict(color='rgb(250, 250, 250)')
+        updatemenus = [dict(
+            type='buttons',
+            direction='left',
+            showactive=False,
+            x=0, y=0, xanchor='left', yanchor='top',
+            pad=dict(t=30),
+            font=dict(color='rgb(0, 0, 0)'),
+            buttons=[
+                dict(label='Play', method='animate', args=[None, play(duration)]),
+                dict(label='Pause', method='animate',
+                     args=[[None], dict(frame=dict(duration=0, redraw=False),
+                                        mode='immediate')])
+            ]
+        )]
+
+        # The step slider follows the played frames, the speed slider
+        # continues playing with the chosen duration.
+        steps = [dict(label=str(i), method='animate',
+                      args=[[str(i)], dict(frame=dict(duration=0, redraw=True),
+                                           transition=dict(duration=0),
+                                           mode='immediate')])
+                 for i in range(start, stop)]
+        speeds = [0.25, 0.5, 1, 2, 4, 8]
+        speed_steps = [dict(label='{}s'.format(seconds), method='animate',
+                            args=[None, play(1000 * seconds)])
+                       for seconds in speeds]
+        closest = min(range(len(speeds)), key=lambda i: abs(1000 * speeds[i] - duration))
+        sliders = [
+            dict(active=active, steps=steps, font=font,
+                 currentvalue=dict(prefix='Snapshot ', font=font),
+                 x=0.15, len=0.55, y=0, pad=dict(t=30)),
+            dict(active=closest, steps=speed_steps, font=font,
+                 currentvalue=dict(prefix='Speed ', font=font),
+                 x=0.75, len=0.25, y=0, pad=dict(t=30))
+        ]
+        return frames, dict(updatemenus=updatemenus, sliders=sliders,
+                            margin=dict(l=0, r=0, b=110, t=30))
+    #end_create_animation
+
+
+    def _prefetch(self, index):
+        # A hint only, the prefetch thread checks the cache again.
+        ahead = [i for i in range(index + 1, index + 1 + self.prefetch)
+                 if i < len(self.snapshots) and i not in self.figures]
+        if not ahead:
+            return
+        if self._prefetcher is not None and self._prefetcher.is_alive():
+            return
+
+        def run():
+            for i in ahead:
+                with self._lock:
+                    if i not in self.figures:
+                        self._cached_figure(i)
+            #endfor
+        #end_run
+
+        self._prefetcher = threading.Thread(target=run, daemon=True)
+        self._prefetcher.start()
+    #end_prefetch
+
+
+    def _create_figure(self, new_snapshot_index, old_snapshot_index=None, f=1):
+        """Build the figure data of a snapshot.
+
+        Args:
+            new_snapshot_index (int): The snapshot to draw.
+            old_snapshot_index (int, optional): The snapshot to animate from,
+                default the same snapshot.
+            f (float, optional): Position between old (0) and new (1).
+        """
         new_snapshot = self.snapshots[new_snapshot_index]
-        self.current_snapshot_index = new_snapshot_index
+        if old_snapshot_index is None:
+            old_snapshot = new_snapshot
+        else:
+            old_snapshot = self.snapshots[old_snapshot_index]
+        #endif
 
         node_colors = {}
         node_label_colors = {}
@@ -359,72 +635,63 @@ class TreeView(object):
 
         def create_edges() -> list:
             # EDGES
-            edges = []
-            for node in new_snapshot['nodes']:
-                edge_between_nodes = None
-                if node != new_snapshot['root']:
-                    # has parent
-                    # TODO refactor tango fix
-                    color = 'rgb(220,220,220)'
-                    width = 1.0
-                    to_dash = None
-                    if 'is_root' in new_snapshot['nodes'][node][1]:
-                        # tango tree quick fix:
-                        # highlight preferred paths
-                        if new_snapshot['nodes'][node][1]['is_root']:
-                            color = 'rgb(220,220,220)'
-                            width = 1.0
-                            to_dash = "dash"
-                        else:
-                            color = 'rgb(135,206,250)'
-                            width = 3.0
-                            to_dash = "solid"
-                        #endif
-                        #----------------EDGES PATHS FOR TANGO-------------------
-
-                        curr_pos_node = currentPos(node, f) # coords of the current node placement
-                        curr_pos_next = currentPos(new_snapshot['nodes'][node][1]['parent'], f) # coords of the destination node
-                        edge_between_nodes = dict(
-                            x=[curr_pos_node[0], curr_pos_next[0]],
-                            y=[curr_pos_node[1], curr_pos_next[1]],
-                            name="Preferred path",
-                            line={
-                                'shape' : 'spline',
-                                'color' : color,
-                                'dash' : to_dash,
-                                'width' : width
-                            },
-                            mode='lines'
-                        )
-                        #----------------\EDGES PATHS FOR TANGO-------------------
-
-                    #endif 'is_root' in new_snapshot['nodes'][node][1]
-                    else:
-                        #----------------EDGES PATHS FOR OTHER-------------------
-                        curr_pos_node = currentPos(node, f)
-                        curr_pos_next = currentPos(new_snapshot['nodes'][node][1]['parent'], f)
-
-                        edge_between_nodes = dict(
-                            x=[curr_pos_node[0], curr_pos_next[0]],
-                            y=[curr_pos_node[1], curr_pos_next[1]],
-                            name="Edge",
-                            line=dict(
-                                shape='spline',
-                                color=color,
-                                dash=to_dash
-                            ),
-                            mode='lines'
-                        )
-                        #----------------\EDGES PATHS FOR OTHER-------------------
-
-                    #endelse 'is_root' in new_snapshot['nodes'][node][1]
+            # One trace per edge style, the edges are separated by None.
+            edge_styles = {}   # (name, color, width, dash) -> (X, Y)
+            unpreferred = ("Preferred path", 'rgb(220,220,220)', 1.0, "dash")
+            preferred = ("Preferred path", 'rgb(135,206,250)', 3.0, "solid")
+            plain = ("Edge", 'rgb(220,220,220)', None, None)
+
+            # The same traces in every snapshot, even empty ones: the frames
+            # of an animation replace the traces by their index.
+            for _, node_dict, _, _ in itertools.islice(new_snapshot['nodes'].values(), 1):
+                if 'is_root' in node_dict:
+                    edge_styles[unpreferred] = ([], [])
+                    edge_styles[preferred] = ([], [])
+                else:
+                    edge_styles[plain] = ([], [])
+                #endif
+            #endfor
 
-                #endif node != new_snapshot['root']
+            for node, (_, node_dict, _, _) in new_snapshot['nodes'].items():
+                if node == new_snapshot['root']:
+                    continue
 
-                if edge_between_nodes is not None:
-                    edges.append(edge_between_nodes)
+                # TODO refactor tango fix
+                if 'is_root' in node_dict:
+                    # tango tree quick fix:
+                    # highlight preferred paths
+                    if node_dict['is_root']:
+                        style = unpreferred
+                    else:
+                        style = preferred
+                    #endif
+                else:
+                    style = plain
+                #endif
 
+                curr_pos_node = currentPos(node, f) # coords of the current node placement
+                curr_pos_next = currentPos(node_dict['parent'], f) # coords of the destination node
+                X, Y = edge_styles.setdefault(style, ([], []))
+                X += [curr_pos_node[0], curr_pos_next[0], None]
+                Y += [curr_pos_node[1], curr_pos_next[1], None]
             #endfor_node
+
+            edges = []
+            for style in sorted(edge_styles, key=str):
+                name, color, width, to_dash = style
+                line = dict(color=color, dash=to_dash)
+                if width is not None:
+                    line['width'] = width
+                X, Y = edge_styles[style]
+                edges.append(dict(
+                    type='scattergl',
+                    x=X,
+                    y=Y,
+                    name=name,
+                    line=line,
+                    mode='lines'
+                ))
+            #endfor
             return edges
         #---end_create_edges-----
 
@@ -438,14 +705,17 @@ class TreeView(object):
             X_nodes_sq = []
             Y_nodes_sq = []
 
-            annotations = self.make_annotations()
-
             labels_circle = []
             labels_sq = []
 
             labels_circle_short = []
             labels_sq_short = []
 
+            X_summaries = []
+            Y_summaries = []
+            keys_summaries = []
+            labels_summaries = []
+
             circles = 0
             squares = 0
 
@@ -479,10 +749,19 @@ class TreeView(object):
                         labels_sq_short += [str(labels_sq[squares])]
 
                     squares += 1
+
+                elif shape is NodeShape.summary:
+                    X_summaries += [x]
+                    Y_summaries += [y]
+                    keys_summaries += [new_snapshot['nodes'][node][1]['key']]
+                    labels_summaries += [new_snapshot['collapsed'][node]]
                 #endif
                 # additional info next to node
             #endfor
+            # Node labels are the text of the (WebGL) marker traces, there
+            # is no annotation per node.
             nodes_dots = dict(
+                        type='scattergl',
                         x=X_nodes_dots,
                         y=Y_nodes_dots,
                         mode='markers+text',
@@ -506,6 +785,7 @@ class TreeView(object):
                       )
 
             nodes_squares = dict(
+                        type='scattergl',
                         x=X_nodes_sq,
                         y=Y_nodes_sq,
                         mode='markers+text',
@@ -529,6 +809,33 @@ class TreeView(object):
 
             dots.append(nodes_dots)
             dots.append(nodes_squares)
+
+            if self.collapse is not None or self.focus is not None:
+                # clicking a glyph passes its key (customdata) to expand()
+                dots.append(dict(
+                        type='scattergl',
+                        x=X_summaries,
+                        y=Y_summaries,
+                        mode='markers+text',
+                        name='',
+                        marker=dict(symbol='diamond',
+                                    size=self.node_radius,
+                                    color='rgb(135,206,250)',
+                                    line=dict(color='rgb(250,250,250)',
+                                    width=1),
+                                    opacity=0.8
+                                ),
+                        text=['+'] * len(X_summaries),
+                        customdata=keys_summaries,
+                        hoverinfo='text',
+                        hovertext=labels_summaries,
+                        textfont=dict(
+                            size=self.font[1],
+                            family=self.font[0],
+                            color='rgb(255, 255, 255)'
+                            )
+                      ))
+            #endif
             return dots
             #---------------------------\NODES------------------------
 
@@ -582,21 +889,19 @@ class TreeView(object):
             return (shapes, arrows)
         #---end_create_shapes-----
 
-        def create_figure(f=1):
+        def create_figure():
 
             edges = create_edges()
             dots = create_dots()
             shapes, arrows = [], []#create_shapes()
             data = go.Data(edges + dots + [arrows])
-            self.figures.append(data)
             #fig = {'data' : data, 'layout' : layout, 'frames' : []}
+            return data
 
         #end_create_figure
 
-        f = 1
-        create_figure()
-        return self.figures[self.current_snapshot_index - 1]
-    #end_view
+        return create_figure()
+    #end_create_figure
 
     # TODO view_after redesign
     def _view_after(self, f):
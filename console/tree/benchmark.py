@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Micro benchmarks for the Tango Tree restructuring primitives.
+
+Run from this directory:
+
+    python benchmark.py [n] [queries]
+
+Every benchmark prints a small table. Unit operations are counted by
+temporarily wrapping methods of the classes involved, times are measured
+with profiling.Profiler.
+"""
+
+import collections
+import random
+import sys
+import time
+
+import tango_strict as tg
+from deferred import DeferredTangoTree
+from profiling import Profiler
+
+
+def uniform_trace(n, q, seed=0):
+    rd = random.Random(seed)
+    return [rd.randrange(n) for _ in range(q)]
+
+
+def repeat_trace(n, q, repeat, seed=0):
+    """Every key is repeated with probability repeat, else uniform."""
+    rd = random.Random(seed)
+    trace = [rd.randrange(n)]
+    for _ in range(q - 1):
+        trace.append(trace[-1] if rd.random() < repeat else rd.randrange(n))
+    return trace
+
+
+def working_set_trace(n, q, size, hot=0.9, seed=0):
+    """Keys from a fixed working set of size keys with probability hot."""
+    rd = random.Random(seed)
+    working_set = [rd.randrange(n) for _ in range(size)]
+    return [rd.choice(working_set) if rd.random() < hot else rd.randrange(n)
+            for _ in range(q)]
+
+
+def zipf_trace(n, q, s=1.2, seed=0):
+    """
+    Keys with Zipf distributed popularity. The ranks are shuffled over the
+    keys the same way for every seed, so traces with different seeds come
+    from the same distribution.
+    """
+    keys = list(range(n))
+    random.Random(n).shuffle(keys)
+    weights = [1 / (rank + 1) ** s for rank in range(n)]
+    return random.Random(seed).choices(keys, weights, k=q)
+
+
+def crossings(t, key):
+    """Number of auxiliary tree roots below the root on the path to key."""
+    count = 0
+    p = t.root
+    while p is not None and p.key != key:
+        p = p.right if p.key < key else p.left
+        if p is not None and p.is_root:
+            count += 1
+    #endwhile
+    return count
+#end_crossings
+
+
+class OpCounter(object):
+
+    """
+    Count the calls of some methods of a class while active.
+
+    Example:
+        >>> with OpCounter(tg.TangoNode, '_update_depths') as c:
+        ...     t.search(3)
+        >>> c.counts['_update_depths']
+    """
+
+    def __init__(self, cls, *names):
+        self.cls = cls
+        self.names = names
+        self.counts = dict.fromkeys(names, 0)
+        self._originals = {}
+
+    def __enter__(self):
+        for name in self.names:
+            original = getattr(self.cls, name)
+            self._originals[name] = original
+            setattr(self.cls, name, self._counting(name, original))
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self._originals.items():
+            setattr(self.cls, name, original)
+
+    def _counting(self, name, original):
+        counts = self.counts
+
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return original(*args, **kwargs)
+        return wrapper
+#end_OpCounter
+
+
+def bench_unit_ops(n, queries):
+    """
+    Unit operations per search: depth and black-height updates, splits and
+    merges per preferred child switch, and time spent in the switches.
+    """
+    trace = uniform_trace(n, queries)
+    t = tg.TangoTree(range(n))
+    prof = Profiler()
+
+    with OpCounter(tg.TangoNode, '_update_depths') as nodes, \
+            OpCounter(tg.TangoTree, 'update_black_height',
+                      '_split', '_aux_merge') as tree, \
+            prof.attached(t):
+        for key in trace:
+            t.search(key)
+    #endwith
+
+    switches = prof.totals['_switch'][0]
+    print('unit operations, n = {}, {} uniform searches'.format(n, queries))
+    print('  _update_depths per search      {:10.1f}'.format(
+        nodes.counts['_update_depths'] / queries))
+    print('  update_black_height per search {:10.1f}'.format(
+        tree.counts['update_black_height'] / queries))
+    print('  switches per search            {:10.1f}'.format(
+        switches / queries))
+    print('  splits per switch              {:10.2f}'.format(
+        tree.counts['_split'] / switches))
+    print('  merges per switch              {:10.2f}'.format(
+        tree.counts['_aux_merge'] / switches))
+    for name in ('_switch', 'search'):
+        calls, inclusive, _ = prof.totals[name]
+        print('  {:<30} {:10.1f} us/call'.format(
+            name, 1e6 * inclusive / calls))
+    #endfor
+#end_bench_unit_ops
+
+
+def build_aux_tree(host, m):
+    """
+    Build a single auxiliary tree with the keys 0..m-1 using the
+    restructuring primitives of host (a TangoTree).
+
+    Returns:
+        (root, nodes)
+    """
+    nodes = [tg.TangoNode(key, depth=key) for key in range(m)]
+    root = nodes[0]
+    root.is_root = False
+    for node in nodes[1:]:
+        node.is_root = False
+        host.attach_left(root, node)
+        root = host._aux_merge(node)
+    #endfor
+    return root, nodes
+#end_build_aux_tree
+
+
+def bench_split_scaling(sizes, repeats=200):
+    """
+    Cost of one cut (split at a random node and merge back) against the
+    size m of the auxiliary tree. For an O(log m) split the operations per
+    log2(m) stay flat; O(log^2 m) behaviour shows up as a growing ratio.
+    """
+    import math
+
+    print('split + merge against auxiliary tree size')
+    print('  {:>8} {:>10} {:>12} {:>14} {:>10}'.format(
+        'm', 'us/cut', 'ops/cut', 'ops/log2(m)', 'rotations'))
+    for m in sizes:
+        host = tg.TangoTree([0])
+        root, nodes = build_aux_tree(host, m)
+        host.root = root
+        rd = random.Random(m)
+        targets = [rd.choice(nodes) for _ in range(repeats)]
+
+        with OpCounter(tg.TangoNode, '_update_depths') as depths, \
+                OpCounter(tg.TangoTree, 'update_black_height',
+                          'rotate_left', 'rotate_right') as ops:
+            start = time.perf_counter()
+            for node in targets:
+                host._split(node, host.root)
+                host._aux_merge(node)
+            #endfor
+            elapsed = time.perf_counter() - start
+        #endwith
+
+        total = depths.counts['_update_depths'] + \
+            ops.counts['update_black_height']
+        rotations = ops.counts['rotate_left'] + ops.counts['rotate_right']
+        print('  {:>8} {:>10.1f} {:>12.1f} {:>14.2f} {:>10.2f}'.format(
+            m, 1e6 * elapsed / repeats, total / repeats,
+            total / repeats / math.log2(m), rotations / repeats))
+    #endfor
+#end_bench_split_scaling
+
+
+def bench_repeats(n, queries, repeats=(0.0, 0.5, 0.9, 0.99)):
+    """
+    Searches against plain descents (peek) for traces repeating the
+    previous key, and the fraction of searches skipping the final
+    restructuring.
+    """
+    print('repeated accesses, n = {}, {} searches'.format(n, queries))
+    print('  {:>8} {:>10} {:>12} {:>10}'.format(
+        'repeat', 'skip rate', 'us/search', 'us/peek'))
+    for repeat in repeats:
+        trace = repeat_trace(n, queries, repeat)
+        t = tg.TangoTree(range(n))
+
+        start = time.perf_counter()
+        for key in trace:
+            t.search(key)
+        searching = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for key in trace:
+            t.peek(key)
+        peeking = time.perf_counter() - start
+
+        print('  {:>8.2f} {:>10.3f} {:>12.1f} {:>10.1f}'.format(
+            repeat, t.stats()['skip_rate'], 1e6 * searching / queries,
+            1e6 * peeking / queries))
+    #endfor
+#end_bench_repeats
+
+
+def bench_deferred(n, queries, batch_sizes=(1, 16, 64, 256, 1024)):
+    """
+    Throughput of DeferredTangoTree against its adaptivity: the number of
+    auxiliary trees crossed per access is the number of preferred child
+    changes a strict tree would need at that moment.
+    """
+    trace = working_set_trace(n, queries, 256)
+
+    print('deferred restructuring, n = {}, {} searches, working set 256'
+          .format(n, queries))
+    print('  {:>8} {:>12} {:>10} {:>12}'.format(
+        'batch', 'us/search', 'applied', 'crossings'))
+    for batch_size in batch_sizes:
+        t = DeferredTangoTree(range(n), batch_size)
+        start = time.perf_counter()
+        for key in trace:
+            t.search(key)
+        t.flush()
+        elapsed = time.perf_counter() - start
+        applied = t.stats()['applied'] / queries
+
+        # Same trace again on a fresh tree, counting before every access.
+        t = DeferredTangoTree(range(n), batch_size)
+        crossed = 0
+        for key in trace:
+            crossed += crossings(t, key)
+            t.search(key)
+        #endfor
+
+        print('  {:>8} {:>12.1f} {:>10.3f} {:>12.2f}'.format(
+            batch_size, 1e6 * elapsed / queries, applied, crossed / queries))
+    #endfor
+#end_bench_deferred
+
+
+def bench_weighted(n, queries):
+    """
+    Perfect against weight-balanced reference tree P, the weights counted
+    on a training trace from the same skewed distribution.
+    """
+    training = zipf_trace(n, queries, seed=1)
+    trace = zipf_trace(n, queries, seed=2)
+    counts = collections.Counter(training)
+
+    print('reference tree P, n = {}, {} zipf searches'.format(n, queries))
+    print('  {:>10} {:>12} {:>12} {:>12}'.format(
+        'P', 'depth in P', 'crossings', 'us/search'))
+    for name, weights in (('perfect', None), ('weighted', counts)):
+        t = tg.TangoTree(range(n), weights)
+        depths = {}
+        stack = [t.root]
+        while stack:
+            node = stack.pop()
+            if node is not None:
+                depths[node.key] = node.depth
+                stack.extend((node.left, node.right))
+        #endwhile
+
+        crossed = 0
+        start = time.perf_counter()
+        for key in trace:
+            t.search(key)
+        elapsed = time.perf_counter() - start
+
+        t = tg.TangoTree(range(n), weights)
+        for key in trace:
+            crossed += crossings(t, key)
+            t.search(key)
+        #endfor
+
+        print('  {:>10} {:>12.2f} {:>12.2f} {:>12.1f}'.format(
+            name, sum(depths[key] for key in trace) / queries,
+            crossed / queries, 1e6 * elapsed / queries))
+    #endfor
+#end_bench_weighted
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 14
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    bench_unit_ops(n, queries)
+    print()
+    bench_repeats(n, queries)
+    print()
+    bench_deferred(n, queries)
+    print()
+    bench_weighted(n, queries)
+    print()
+    bench_split_scaling([2 ** i for i in range(4, 17, 2)])
+
+
+if __name__ == '__main__':
+    main()
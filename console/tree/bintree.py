@@ -21,6 +21,35 @@ class BinaryTree(object):
                 return -1
         return h(self.root)
 
+    def inorder(self):
+        """
+        Returns the keys of the tree in ascending order as a list.
+        """
+        keys = []
+        stack = []
+        p = self.root
+        while stack or p is not None:
+            if p is not None:
+                stack.append(p)
+                p = p.left
+            else:
+                p = stack.pop()
+                keys.append(p.key)
+                p = p.right
+            #endif
+        #endwhile
+        return keys
+
+    def freeze(self):
+        """
+        Export the current key set as a static frozen.FrozenTree.
+
+        The snapshot supports (batched) membership checks without touching
+        the nodes of this tree and is not affected by later changes.
+        """
+        from frozen import FrozenTree
+        return FrozenTree(self.inorder())
+
 
 class Node(object):
 
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compact Tango Trees for dense integer universes.
+
+A TangoNode is a regular Python object: an instance dict holding the key,
+the depth in P, data and tree references besides the pointers and the
+balancing fields, every int a separate object. For a universe range(m) the
+key and the depth of a node follow from its in-order rank alone:
+
+    key   = universe[rank]
+    depth = depth of rank in the perfect tree of perfect_inserter
+
+The perfect tree is the complete tree of height h = floor(log2 m) with
+its last level filled from the left. The first L = m - (2^h - 1) leaves
+of the last level take the even ranks 0, 2, .., 2L - 2, so rank r is the
+position R = r (r < 2L) or R = 2r - 2L + 1 (r >= 2L) in the full tree of
+height h, where the depth is h - ctz(R + 1).
+
+CompactTangoTree keeps no node objects at all. The fields of the node of
+rank r are the r-th entries of parallel arrays on the tree: the pointers
+as ranks (-1 for None) in array('i')s, color, black-height, min/max depth
+and the mark in bytearrays, 25 bytes per node:
+
+    t = CompactTangoTree(range(10 ** 6))
+
+needs about a ninth of the memory of TangoTree(range(10 ** 6)) (python
+compact.py measures it). The restructuring code of TangoTree runs
+unchanged on CompactTangoNodes, small handles that read and write the
+arrays. Within a search the tree hands out one handle per rank, so the
+restructuring can compare nodes by identity; the handles are dropped when
+the search ends and handles of the same rank compare equal. The price is
+a property call instead of an attribute load per field access, which
+makes a search several times slower.
+"""
+
+import array
+import operator
+import sys
+
+from tango_strict import TangoTree, TangoNode, RED, BLACK
+from naive import perfect_split
+
+
+def _link(name):
+    """A pointer of the node kept as a rank in the array tree.<name>."""
+    ranks = operator.attrgetter(name)
+
+    def get(self):
+        tree = self.tree
+        rank = ranks(tree)[self.rank]
+        if rank < 0:
+            return None
+        node = tree._nodes.get(rank)
+        if node is None:
+            node = tree._nodes[rank] = CompactTangoNode(rank, tree)
+        return node
+    #end_get
+
+    def set(self, node):
+        ranks(self.tree)[self.rank] = -1 if node is None else node.rank
+
+    return property(get, set)
+#end_link
+
+
+def _field(name):
+    """A small int field of the node kept in the bytearray tree.<name>."""
+    values = operator.attrgetter(name)
+
+    def get(self):
+        return values(self.tree)[self.rank]
+
+    def set(self, value):
+        values(self.tree)[self.rank] = value
+
+    return property(get, set)
+#end_field
+
+
+class CompactTangoNode(object):
+
+    """
+    A handle to the node of a rank in a CompactTangoTree. All fields live
+    in the arrays of the tree, see the module doc.
+
+    Args:
+        rank (int): The in-order rank of the node in P.
+        tree (CompactTangoTree)
+    """
+
+    __slots__ = ('rank', 'tree')
+
+    def __init__(self, rank, tree):
+        self.rank = rank
+        self.tree = tree
+    #end__init__
+
+    # Two handles of the same node are equal, e.g. in the sets of watch().
+    def __eq__(self, other):
+        return (isinstance(other, CompactTangoNode)
+                and self.rank == other.rank and self.tree is other.tree)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self.rank
+
+    parent = _link('_parent')
+    left = _link('_left')
+    right = _link('_right')
+    prev = _link('_prev')
+    next = _link('_next')
+
+    bh = _field('_bh')
+    min_depth = _field('_min_depth')
+    max_depth = _field('_max_depth')
+
+    @property
+    def color(self):
+        return RED if self.tree._red[self.rank] else BLACK
+
+    @color.setter
+    def color(self, color):
+        self.tree._red[self.rank] = color == RED
+
+    @property
+    def is_root(self):
+        return bool(self.tree._is_root[self.rank])
+
+    @is_root.setter
+    def is_root(self, is_root):
+        self.tree._is_root[self.rank] = is_root
+
+    @property
+    def key(self):
+        return self.tree._universe[self.rank]
+
+    @property
+    def depth(self):
+        return self.tree._depth(self.rank)
+
+    # The augmentation is the same as for TangoNode.
+    _update_depths = TangoNode._update_depths
+#end_CompactTangoNode
+
+
+class CompactTangoTree(TangoTree):
+
+    """
+    A TangoTree over a range of integers with its nodes in arrays.
+
+    Args:
+        keys (range): The static universe of keys, an increasing range of
+            less than 2^31 keys.
+    """
+
+    def __init__(self, keys):
+        if not isinstance(keys, range) or keys.step <= 0:
+            raise AttributeError("CompactTangoTree needs an increasing range")
+        if len(keys) >= 1 << 31:
+            raise AttributeError("CompactTangoTree holds less than 2^31 keys")
+        super().__init__(keys)
+    #end__init__
+
+    def _build_reference_tree(self, keys, weights):
+        """Fill the arrays of the perfect tree P by rank arithmetic."""
+        self.constructed = True
+
+        m = len(keys)
+        self._universe = keys
+        h = m.bit_length() - 1
+        self._shape = (h, 2 * (m - ((1 << h) - 1)))
+
+        none = array.array('i', [-1])
+        self._parent = none * m
+        self._left = none * m
+        self._right = none * m
+        self._prev = none * m
+        self._next = none * m
+
+        # every node is a black single node auxiliary tree
+        self._red = bytearray(m)
+        self._bh = bytearray([1]) * m
+        self._is_root = bytearray([1]) * m
+        self._min_depth = bytearray(m)
+        self._max_depth = bytearray(m)
+
+        # rank -> handle of the nodes used by the running search
+        self._nodes = {}
+
+        # (lo, hi, parent, is_left, depth) for the subtree over lo..hi-1
+        stack = [(0, m, -1, False, 0)]
+        while stack:
+            lo, hi, parent, is_left, depth = stack.pop()
+            if lo >= hi:
+                continue
+            rank = lo + perfect_split(hi - lo)
+            self._parent[rank] = parent
+            self._min_depth[rank] = self._max_depth[rank] = depth
+            if parent < 0:
+                self.root = self._node(rank)
+            elif is_left:
+                self._left[parent] = rank
+            else:
+                self._right[parent] = rank
+            #endif
+            stack.append((lo, rank, rank, True, depth + 1))
+            stack.append((rank + 1, hi, rank, False, depth + 1))
+        #endwhile
+    #end_build_reference_tree
+
+    def _node(self, rank):
+        """The handle of rank, the same one until the next search ends."""
+        node = self._nodes.get(rank)
+        if node is None:
+            node = self._nodes[rank] = CompactTangoNode(rank, self)
+        return node
+    #end_node
+
+    def search(self, key):
+        try:
+            return super().search(key)
+        finally:
+            # Forget the handles, the restructuring compares nodes by
+            # identity only within one search.
+            self._nodes.clear()
+            self._nodes[self.root.rank] = self.root
+        #endtry
+    #end_search
+
+    def _depth(self, rank):
+        """The depth of rank in P, see the module doc."""
+        h, two_l = self._shape
+        x = (rank if rank < two_l else 2 * rank - two_l + 1) + 1
+        return h - (x & -x).bit_length() + 1
+    #end_depth
+#end_CompactTangoTree
+
+
+def main():
+    import time
+    import tracemalloc
+
+    m = int(sys.argv[1]) if len(sys.argv) > 1 else 1 << 17
+    print('{:>16} {:>14} {:>12} {:>12}'.format(
+        'tree', 'bytes/node', 'build [s]', 'us/search'))
+    for cls in (TangoTree, CompactTangoTree):
+        tracemalloc.start()
+        start = time.perf_counter()
+        t = cls(range(m))
+        built = time.perf_counter() - start
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        import random
+        rd = random.Random(0)
+        trace = [rd.randrange(m) for _ in range(2000)]
+        start = time.perf_counter()
+        for key in trace:
+            t.search(key)
+        searching = time.perf_counter() - start
+
+        print('{:>16} {:>14.1f} {:>12.2f} {:>12.1f}'.format(
+            cls.__name__, size / m, built, 1e6 * searching / len(trace)))
+        del t
+    #endfor
+#end_main
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Deferred, batched restructuring for Tango Trees.
+
+A search on a TangoTree first descends to the key and then changes the
+preferred paths on the way, which is where almost all of its time goes.
+DeferredTangoTree answers a search with the plain descent (peek) and only
+records the access. Misses are recorded as well, a strict search for an
+absent key still switches the preferred paths on its way down. The
+recorded accesses are applied as one batch every batch_size searches or
+when flush() is called:
+
+    t = DeferredTangoTree(range(1000), batch_size=64)
+    t.search(42)        # 42, the tree is not restructured yet
+    t.flush()           # apply the pending accesses now
+
+The preferred child of a node only depends on the last access through its
+subtree, so of several accesses to the same key only the last one has to be
+applied; the earlier ones would be undone by it anyway. A batch therefore
+replays the last occurrence of every pending key, in the order of these
+last occurrences, and ends with the same preferred paths as the strict
+tree. The shapes of the auxiliary trees may differ.
+
+Between two batches the tree lags behind the access sequence: it adapts to
+the working set once per batch instead of once per access. That is the
+trade-off measured by benchmark.bench_deferred().
+"""
+
+from tango_strict import TangoTree
+
+
+class DeferredTangoTree(TangoTree):
+
+    """
+    A TangoTree applying its restructuring in batches.
+
+    Args:
+        keys (list): The static universe of keys.
+        batch_size (int, optional): Number of recorded accesses that
+            triggers a flush(), default 64. 0 only flushes on request.
+        weights (dict, optional): Access counts per key, see TangoTree.
+    """
+
+    def __init__(self, keys, batch_size=64, weights=None):
+        super().__init__(keys, weights)
+
+        self.batch_size = batch_size
+        self._pending = []
+        self._batch_stats = {'batches': 0, 'deferred': 0, 'applied': 0}
+    #end__init__
+
+    def search(self, key):
+        """
+        Search for key without restructuring the tree.
+
+        Hits and misses are recorded, keys that are no numbers are not.
+
+        Returns:
+            The key if it is in the tree, otherwise None.
+        """
+        result = self.peek(key)
+        try:
+            access = int(float(key))
+        except Exception:
+            return None
+        #endtry
+
+        self._pending.append(access)
+        if self.batch_size and len(self._pending) >= self.batch_size:
+            self.flush()
+        return result
+    #end_search
+
+    def flush(self):
+        """
+        Apply all pending accesses.
+
+        Returns:
+            The number of accesses actually replayed.
+        """
+        pending = self._pending
+        if not pending:
+            return 0
+        self._pending = []
+
+        # Keep the last occurrence of every key.
+        seen = set()
+        batch = []
+        for key in reversed(pending):
+            if key not in seen:
+                seen.add(key)
+                batch.append(key)
+        #endfor
+        batch.reverse()
+
+        for key in batch:
+            super().search(key)
+
+        stats = self._batch_stats
+        stats['batches'] += 1
+        stats['deferred'] += len(pending)
+        stats['applied'] += len(batch)
+        return len(batch)
+    #end_flush
+
+    @property
+    def pending(self):
+        """Number of recorded accesses not yet applied."""
+        return len(self._pending)
+
+    def stats(self):
+        """
+        Returns:
+            The stats of TangoTree.stats() for the replayed accesses plus
+            the number of batches, the accesses recorded by flushed batches
+            ('deferred'), the accesses replayed ('applied') and the number
+            of pending accesses.
+        """
+        stats = super().stats()
+        stats.update(self._batch_stats)
+        stats['pending'] = len(self._pending)
+        return stats
+    #end_stats
+#end_DeferredTangoTree
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+A frozen, cache-friendly snapshot of the key set of a BinaryTree.
+
+For read-mostly periods the linked node structure of a tree is a poor fit
+for bulk membership checks: every comparison chases a pointer to a
+separately allocated Python object. FrozenTree stores the keys of a tree in
+Eytzinger (BFS) order in one contiguous NumPy array, i.e. the children of
+slot k are the slots 2k and 2k+1. The top levels of the implicit tree share
+a few cache lines and the descent
+
+    k = 2*k + (b[k] < x)
+
+has no data dependent branch, so it can be run for a whole batch of
+queries at once with NumPy array operations.
+
+The snapshot does not follow later changes of the tree. Use
+BinaryTree.freeze() to create one.
+"""
+
+import numpy as np
+
+
+class FrozenTree(object):
+
+    """
+    Static lookup structure over a sorted sequence of distinct keys.
+
+    Args:
+        keys (iterable): The keys in ascending order, e.g. the in-order
+            traversal of a binary search tree.
+    """
+
+    def __init__(self, keys):
+        keys = np.asarray(list(keys))
+        self.size = len(keys)
+
+        # Slot 0 is unused so that the children of k are 2k and 2k+1.
+        self._b = np.empty(self.size + 1, dtype=keys.dtype)
+        if self.size:
+            self._b[0] = keys[0]
+        self._fill(keys)
+
+        # Every descent takes exactly this many steps.
+        self._steps = self.size.bit_length()
+    #end__init__
+
+    def _fill(self, keys):
+        """
+        Write keys in Eytzinger order into self._b.
+
+        An in-order walk over the implicit tree (slots 1..n) visits the
+        slots in key order, so the i-th visited slot gets keys[i].
+        """
+        slots = np.fromiter(self._inorder_slots(), dtype=np.int64,
+                            count=self.size)
+        self._b[slots] = keys
+    #end_fill
+
+    def _lower_bound_slots(self, queries):
+        """
+        Returns the slot of the smallest key >= query for each query,
+        0 if there is none.
+        """
+        b = self._b
+        n = self.size
+        k = np.ones(len(queries), dtype=np.int64)
+
+        for _ in range(self._steps):
+            active = k <= n
+            # Inactive lanes read slot 0 and keep their k.
+            step = 2 * k + (b[np.where(active, k, 0)] < queries)
+            k = np.where(active, step, k)
+        #endfor
+
+        # k went right on every step after the answer, so drop the trailing
+        # 1-bits plus the final left step: k >> (ffs(~k)).
+        lowest_zero = (k + 1) & ~k
+        return k // (2 * lowest_zero)
+    #end_lower_bound_slots
+
+    def lookup(self, keys):
+        """
+        Vectorized membership test.
+
+        Args:
+            keys (array_like): The keys to look up.
+
+        Returns:
+            numpy.ndarray of bool: True where the key is in the snapshot.
+        """
+        queries = np.asarray(keys)
+        if self.size == 0:
+            return np.zeros(queries.shape, dtype=bool)
+
+        flat = queries.reshape(-1)
+        slots = self._lower_bound_slots(flat)
+        found = (slots != 0) & (self._b[slots] == flat)
+        return found.reshape(queries.shape)
+    #end_lookup
+
+    def contains(self, key):
+        """Returns True if key is in the snapshot."""
+        return bool(self.lookup([key])[0])
+    #end_contains
+
+    def __contains__(self, key):
+        return self.contains(key)
+
+    def __len__(self):
+        return self.size
+
+    def keys(self):
+        """Returns the keys in ascending order as a list."""
+        slots = np.fromiter(self._inorder_slots(), dtype=np.int64,
+                            count=self.size)
+        return self._b[slots].tolist()
+    #end_keys
+
+    def _inorder_slots(self):
+        n = self.size
+        k = 1
+        stack = []
+        while stack or k <= n:
+            if k <= n:
+                stack.append(k)
+                k = 2 * k
+            else:
+                k = stack.pop()
+                yield k
+                k = 2 * k + 1
+            #endif
+        #endwhile
+    #end_inorder_slots
+#end_FrozenTree
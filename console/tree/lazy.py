@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Lazily materialized Tango Trees for huge integer universes.
+
+TangoTree(range(m)) inserts all m keys into the perfect reference tree P
+before the first search. For a range the shape of P is known without
+building it: the root of a subtree over the ranks lo..hi-1 is the rank
+lo + perfect_split(hi - lo), its children are the roots of the two halves
+and their depth is one more.
+
+A part of P no search has reached yet is still in its initial state, a
+perfect subtree whose nodes are all single node auxiliary trees. The
+restructuring never looks into such a subtree, it only moves its root
+around as an opaque marked child. LazyTangoTree therefore creates a node
+of P only with its parent: a LazyTangoNode knows the rank range of its
+subtree and creates its two children the first time its left or right
+pointer is read or written.
+
+    t = LazyTangoTree(range(10 ** 9))    # starts instantly
+    t.search(123456789)
+    t.materialized()                     # about 2 * log2(10^9) nodes
+
+Memory is proportional to the number of nodes on the search paths so far.
+"""
+
+from tango_strict import TangoTree, TangoNode
+from naive import perfect_split
+
+
+class LazyTangoNode(TangoNode):
+
+    """
+    A node of P over a range universe whose children are created on
+    first use.
+
+    Args:
+        universe (range): All keys of the tree.
+        lo (int), hi (int): The ranks lo..hi-1 of the subtree of this node
+            in P, lo < hi.
+        depth (int): The depth of the node in P.
+        parent (LazyTangoNode, optional)
+    """
+
+    def __init__(self, universe, lo, hi, depth, parent=None):
+        # Must exist before TangoNode.__init__ sets the children.
+        self._pending = None
+        self._left = None
+        self._right = None
+
+        x = lo + perfect_split(hi - lo)
+        super().__init__(universe[x], parent=parent, depth=depth)
+
+        self._pending = (universe, lo, x, hi)
+    #end__init__
+
+    def _expand(self):
+        """Create the children in P (both untouched single node trees)."""
+        universe, lo, x, hi = self._pending
+        self._pending = None
+        if lo < x:
+            self._left = LazyTangoNode(universe, lo, x, self.depth + 1, self)
+        if x + 1 < hi:
+            self._right = LazyTangoNode(universe, x + 1, hi,
+                                        self.depth + 1, self)
+    #end_expand
+
+    @property
+    def left(self):
+        if self._pending is not None:
+            self._expand()
+        return self._left
+
+    @left.setter
+    def left(self, node):
+        if self._pending is not None:
+            self._expand()
+        self._left = node
+
+    @property
+    def right(self):
+        if self._pending is not None:
+            self._expand()
+        return self._right
+
+    @right.setter
+    def right(self, node):
+        if self._pending is not None:
+            self._expand()
+        self._right = node
+#end_LazyTangoNode
+
+
+class LazyTangoTree(TangoTree):
+
+    """
+    A TangoTree over a range of integers whose reference tree P is built
+    on demand.
+
+    Args:
+        keys (range): The static universe of keys, an increasing range.
+    """
+
+    def __init__(self, keys):
+        if not isinstance(keys, range) or keys.step <= 0:
+            raise AttributeError("LazyTangoTree needs an increasing range")
+        self._universe = keys
+        super().__init__(keys)
+    #end__init__
+
+    def _build_reference_tree(self, keys, weights):
+        self.constructed = True
+        self.root = LazyTangoNode(keys, 0, len(keys), 0)
+    #end_build_reference_tree
+
+    def peek(self, key):
+        """
+        Look up key without restructuring and without materializing
+        anything.
+
+        Returns:
+            The key if it is in the tree, otherwise None.
+        """
+        try:
+            key = int(float(key))
+        except Exception:
+            return None
+        return key if key in self._universe else None
+    #end_peek
+
+    def materialized(self):
+        """Returns the number of nodes created so far."""
+        count = 0
+        stack = [self.root]
+        while stack:
+            p = stack.pop()
+            count += 1
+            # read the raw pointers, the properties would expand p
+            for child in (p._left, p._right):
+                if child is not None:
+                    stack.append(child)
+        #endwhile
+        return count
+    #end_materialized
+#end_LazyTangoTree
@@ -1,3 +1,6 @@
+import bisect
+from itertools import accumulate
+
 from bintree import BinaryTree, Node
 
 
@@ -121,33 +124,74 @@ class NaiveBST(BinaryTree):
         return self.root.preorder()
 
 
+def perfect_split(n):
+    """find the point so partition n keys for a perfect tree"""
+    # x = 1
+    # while x <= n//2:
+    #     x *= 2
+    x = 1 << (n.bit_length() - 1)
+    if x//2 - 1 <= (n-x):
+        return x - 1
+    else:
+        return n - x//2
+
+
 def perfect_inserter(t, keys):
     """Insert keys into tree t such that t is perfect.
     Args:
         t (BinaryTree): An empty tree.
         keys (list): A sorted list of keys.
     """
-    def f(n):
-        """find the point so partition n keys for a perfect tree"""
-        # x = 1
-        # while x <= n//2:
-        #     x *= 2
-        x = 1 << (n.bit_length() - 1)
-        if x//2 - 1 <= (n-x):
-            return x - 1
-        else:
-            return n - x//2
-
     n = len(keys)
     if n == 0:
         return
     else:
-        x = f(n)
+        x = perfect_split(n)
         t.insert(keys[x])
         perfect_inserter(t, keys[:x])
         perfect_inserter(t, keys[x+1:])
 
 
+def weight_balanced_inserter(t, keys, weights):
+    """Insert keys into tree t such that t is approximately weight-balanced.
+
+    Every subtree is rooted at the key whose weight interval contains the
+    middle of the total weight of the subtree (Mehlhorn's bisection rule).
+    Both subtrees of a root weigh at most half as much as the whole, so a
+    key of weight w > 0 ends up at depth at most log2(W / w) where W is the
+    total weight. Subtrees without any weight are built perfect.
+    O(n log n) for n keys.
+
+    Args:
+        t (BinaryTree): An empty tree.
+        keys (list): A sorted list of keys.
+        weights (list): The non-negative weight of each key, e.g. its
+            number of accesses.
+    """
+    # prefix[i] is the weight of keys[:i]
+    prefix = [0] + list(accumulate(weights))
+
+    # Insert in preorder so every key is placed below its final parent.
+    stack = [(0, len(keys))]
+    while stack:
+        lo, hi = stack.pop()
+        if lo >= hi:
+            continue
+        total = prefix[hi] - prefix[lo]
+        if total > 0:
+            middle = prefix[lo] + total / 2
+            # the first key whose interval [prefix[x], prefix[x+1]] reaches
+            # the middle
+            x = bisect.bisect_left(prefix, middle, lo + 1, hi) - 1
+        else:
+            x = lo + perfect_split(hi - lo)
+        #endif
+        t.insert(keys[x])
+        stack.append((x + 1, hi))
+        stack.append((lo, x))
+    #endwhile
+
+
 
 if __name__ == '__main__':
     pass
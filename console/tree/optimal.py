@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Offline-optimal static BST as a yardstick for an access trace.
+
+Given the whole trace in advance, the best static BST for it is the one
+minimizing the sum of the access costs. Its cost is the part of the
+traffic no BST can avoid without adapting to the order of the accesses;
+whatever a TangoTree saves beyond that comes from exploiting the order,
+whatever it loses is the price of adapting.
+
+    compare(trace)      # {'optimal': ..., 'rb': ..., 'naive': ..., ...}
+
+The cost of an access is the number of nodes on the path from the root to
+the key, i.e. depth + 1. For the TangoTree it is taken on the tree as it is
+right before the access, the restructuring after it is not counted.
+
+Small traces (at most exact_limit distinct keys) get the exact optimum
+from Knuth's O(n^2) dynamic program, larger ones the weight-balanced tree
+of naive.weight_balanced_inserter, whose cost is at most H + 1 per access
+for the entropy H of the access distribution, while the optimum is at
+least H / log2(3).
+
+Run from this directory with a file from tests/ or a generated trace:
+
+    python optimal.py tests/test_set_0.txt
+    python optimal.py [n] [queries]
+"""
+
+import collections
+import math
+import sys
+
+import tango_strict as tg
+from naive import NaiveBST, weight_balanced_inserter
+from rb import RBTree
+
+
+EXACT_LIMIT = 1000
+
+
+def knuth_roots(weights):
+    """
+    Knuth's dynamic program for the optimal BST over keys with the given
+    access weights (no weights for unsuccessful searches).
+
+    Returns:
+        root (list of lists): root[i][j] is the index of the root of the
+            optimal tree over the keys i..j-1.
+    """
+    n = len(weights)
+    prefix = [0]
+    for w in weights:
+        prefix.append(prefix[-1] + w)
+
+    # cost[i][j]: cost of the optimal tree over the keys i..j-1
+    cost = [[0] * (n + 1) for _ in range(n + 1)]
+    root = [[0] * (n + 1) for _ in range(n + 1)]
+    for i in range(n):
+        cost[i][i + 1] = weights[i]
+        root[i][i + 1] = i
+    #endfor
+
+    for length in range(2, n + 1):
+        for i in range(n - length + 1):
+            j = i + length
+            cost_i = cost[i]
+            best = None
+            best_r = i
+            # Knuth: root[i][j-1] <= root[i][j] <= root[i+1][j]
+            for r in range(root[i][j - 1], root[i + 1][j] + 1):
+                c = cost_i[r] + cost[r + 1][j]
+                if best is None or c < best:
+                    best = c
+                    best_r = r
+            #endfor
+            cost_i[j] = best + prefix[j] - prefix[i]
+            root[i][j] = best_r
+        #endfor
+    #endfor
+    return root
+#end_knuth_roots
+
+
+def optimal_bst(keys, weights):
+    """
+    Build the optimal static BST over keys.
+
+    Args:
+        keys (list): A sorted list of keys.
+        weights (list): The number of accesses of each key.
+
+    Returns:
+        NaiveBST
+    """
+    t = NaiveBST()
+    if not keys:
+        return t
+    root = knuth_roots(weights)
+
+    # Insert in preorder so every key is placed below its final parent.
+    stack = [(0, len(keys))]
+    while stack:
+        i, j = stack.pop()
+        if i >= j:
+            continue
+        r = root[i][j]
+        t.insert(keys[r])
+        stack.append((r + 1, j))
+        stack.append((i, r))
+    #endwhile
+    return t
+#end_optimal_bst
+
+
+def static_bst(trace, exact_limit=EXACT_LIMIT):
+    """
+    The best static BST over the keys of trace that can be afforded.
+
+    Keys that are never accessed do not change the cost, so only the
+    distinct keys of the trace take part.
+
+    Returns:
+        (NaiveBST, exact): exact is False if the tree is the weight-balanced
+        approximation.
+    """
+    counts = collections.Counter(trace)
+    keys = sorted(counts)
+    weights = [counts[key] for key in keys]
+
+    if len(keys) <= exact_limit:
+        return optimal_bst(keys, weights), True
+
+    t = NaiveBST()
+    weight_balanced_inserter(t, keys, weights)
+    return t, False
+#end_static_bst
+
+
+def depths(t):
+    """Returns the dict key -> depth for the nodes of t."""
+    result = {}
+    stack = [(t.root, 0)]
+    while stack:
+        p, depth = stack.pop()
+        if p is None:
+            continue
+        result[p.key] = depth
+        stack.append((p.left, depth + 1))
+        stack.append((p.right, depth + 1))
+    #endwhile
+    return result
+#end_depths
+
+
+def static_cost(t, trace):
+    """Total cost of trace on the static tree t."""
+    d = depths(t)
+    return sum(d[key] + 1 for key in trace)
+
+
+def tango_cost(trace, keys):
+    """Total cost of trace on a TangoTree over keys, see module doc."""
+    t = tg.TangoTree(keys)
+    total = 0
+    for key in trace:
+        p = t.root
+        while p.key != key:
+            p = p.right if p.key < key else p.left
+            total += 1
+        #endwhile
+        total += 1
+        t.search(key)
+    #endfor
+    return total
+#end_tango_cost
+
+
+def entropy(trace):
+    """The entropy of the access distribution of trace in bits."""
+    counts = collections.Counter(trace)
+    q = len(trace)
+    return sum(c / q * math.log2(q / c) for c in counts.values())
+
+
+def compare(trace, keys=None, exact_limit=EXACT_LIMIT):
+    """
+    Cost per access of trace on the static optimum and on the trees of this
+    package.
+
+    Args:
+        trace (list): The accessed keys, all of them in keys.
+        keys (list, optional): The universe, default the keys of trace.
+        exact_limit (int, optional): Largest number of distinct keys for
+            which the exact optimum is computed.
+
+    Returns:
+        dict: 'optimal' (the static optimum or its approximation), 'exact'
+        (bool), 'rb', 'naive' and 'tango' as cost per access and 'entropy'
+        of the access distribution.
+    """
+    if keys is None:
+        keys = sorted(set(trace))
+    q = len(trace)
+
+    best, exact = static_bst(trace, exact_limit)
+
+    rb = RBTree()
+    for key in keys:
+        rb.insert(key)
+
+    # A plain BST built in the order the keys are first accessed.
+    naive = NaiveBST()
+    for key in dict.fromkeys(trace):
+        naive.insert(key)
+
+    return {
+        'optimal': static_cost(best, trace) / q,
+        'exact': exact,
+        'rb': static_cost(rb, trace) / q,
+        'naive': static_cost(naive, trace) / q,
+        'tango': tango_cost(trace, keys) / q,
+        'entropy': entropy(trace),
+    }
+#end_compare
+
+
+def read_test(file_name):
+    """
+    Read a trace in the format of tests/ (number of queries, key range,
+    one query per line). Invalid and out of range queries are dropped.
+
+    Returns:
+        (trace, keys)
+    """
+    with open(file_name) as f:
+        n = int(f.readline())
+        m = int(f.readline())
+        trace = []
+        for _ in range(n):
+            try:
+                key = int(f.readline())
+            except ValueError:
+                continue
+            if 0 <= key < m:
+                trace.append(key)
+        #endfor
+    #endwith
+    return trace, list(range(m))
+#end_read_test
+
+
+def main():
+    if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+        trace, keys = read_test(sys.argv[1])
+    else:
+        import random
+        n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+        q = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+        rd = random.Random(0)
+        # half of the accesses go to a working set of 32 keys
+        working_set = [rd.randrange(n) for _ in range(32)]
+        trace = [rd.choice(working_set) if rd.random() < 0.5
+                 else rd.randrange(n) for _ in range(q)]
+        keys = list(range(n))
+    #endif
+
+    costs = compare(trace, keys)
+    print('{} accesses, {} distinct keys, universe {}'.format(
+        len(trace), len(set(trace)), len(keys)))
+    print('  {:<22} {:>10.2f}'.format(
+        'static optimum' if costs['exact'] else 'weight-balanced',
+        costs['optimal']))
+    for name in ('rb', 'naive', 'tango'):
+        print('  {:<22} {:>10.2f}'.format(name, costs[name]))
+    print('  {:<22} {:>10.2f}'.format('entropy H', costs['entropy']))
+    print('  {:<22} {:>10.2f}'.format('lower bound H/log2(3)',
+                                      costs['entropy'] / math.log2(3)))
+#end_main
+
+
+if __name__ == '__main__':
+    main()
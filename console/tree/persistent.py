@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Persistent (versioned) Tango Trees.
+
+A Tango tree restructures itself on every search, so a reader that walks
+the live tree while searches run sees a mix of old and new preferred paths.
+PersistentTangoTree publishes an immutable Version after every search
+instead. A version is a tree of VersionNode records which only hold
+child pointers (no parent pointers), so a new version can share every
+unchanged subtree with its predecessor:
+
+    only the nodes touched by the search (split, merge, rotations and
+    (un)marking) and their ancestors are copied, i.e. path copying.
+
+Old versions stay readable for as long as someone holds a reference and
+are garbage collected afterwards; the tree itself only keeps the newest
+one.
+
+    t = PersistentTangoTree(range(1000))
+    snapshot = t.version
+    t.search(42)                # creates a new version
+    snapshot.contains(42)       # the old version is unchanged
+"""
+
+import weakref
+
+from tango_strict import TangoTree
+
+
+class VersionNode(object):
+
+    """
+    Immutable record of a TangoNode in one version.
+
+    Attributes:
+        key
+        depth (int): depth of the node in the reference tree P.
+        color
+        is_root (bool): True if the node is the root of an auxiliary tree.
+        left (VersionNode)
+        right (VersionNode)
+    """
+
+    __slots__ = ('key', 'depth', 'color', 'is_root', 'left', 'right')
+
+    def __init__(self, node, left, right):
+        self.key = node.key
+        self.depth = node.depth
+        self.color = node.color
+        self.is_root = node.is_root
+        self.left = left
+        self.right = right
+    #end__init__
+#end_VersionNode
+
+
+class Version(object):
+
+    """
+    A read-only snapshot of a PersistentTangoTree.
+
+    Args:
+        number (int): The number of searches performed before the snapshot.
+        root (VersionNode): The root record.
+    """
+
+    def __init__(self, number, root):
+        self.number = number
+        self.root = root
+    #end__init__
+
+    def peek(self, key):
+        """
+        Returns:
+            The key if it is in this version, otherwise None.
+        """
+        p = self.root
+        while p is not None:
+            if p.key < key:
+                p = p.right
+            elif p.key > key:
+                p = p.left
+            else:
+                return p.key
+            #endif
+        #endwhile
+        return None
+    #end_peek
+
+    def contains(self, key):
+        return self.peek(key) is not None
+
+    def inorder(self):
+        """Returns the keys in ascending order as a list."""
+        keys = []
+        stack = []
+        p = self.root
+        while stack or p is not None:
+            if p is not None:
+                stack.append(p)
+                p = p.left
+            else:
+                p = stack.pop()
+                keys.append(p.key)
+                p = p.right
+            #endif
+        #endwhile
+        return keys
+    #end_inorder
+
+    def preorder(self):
+        """Returns the preorder traversal as list of keys."""
+        keys = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            p = stack.pop()
+            keys.append(p.key)
+            if p.right is not None:
+                stack.append(p.right)
+            if p.left is not None:
+                stack.append(p.left)
+        #endwhile
+        return keys
+    #end_preorder
+
+    def aux_roots(self):
+        """Returns the keys of all auxiliary tree roots in preorder."""
+        roots = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            p = stack.pop()
+            if p.is_root:
+                roots.append(p.key)
+            if p.right is not None:
+                stack.append(p.right)
+            if p.left is not None:
+                stack.append(p.left)
+        #endwhile
+        return roots
+    #end_aux_roots
+#end_Version
+
+
+class PersistentTangoTree(TangoTree):
+
+    """
+    A TangoTree that publishes an immutable Version after every search.
+
+    Args:
+        keys (list): The static universe of keys.
+        weights (dict, optional): Access counts per key, see TangoTree.
+
+    Attributes:
+        version (Version): The newest version.
+    """
+
+    def __init__(self, keys, weights=None):
+        super().__init__(keys, weights)
+
+        self._changes = self.watch()
+        # The records of the newest version. Old records are only referenced
+        # by old versions and vanish together with them.
+        self._records = {}
+        self._versions = weakref.WeakValueDictionary()
+
+        self._searches = 0
+        self._publish(self._copy_all())
+    #end__init__
+
+    def search(self, key):
+        result = super().search(key)
+        self._searches += 1
+        self._publish(self._copy_path())
+        return result
+    #end_search
+
+    def get_version(self, number):
+        """
+        Returns:
+            The version created after the given number of searches if it is
+            still referenced somewhere, otherwise None.
+        """
+        return self._versions.get(number)
+    #end_get_version
+
+    def _publish(self, root):
+        self.version = Version(self._searches, root)
+        self._versions[self._searches] = self.version
+    #end_publish
+
+    def _copy_all(self):
+        """Create records for every node (initial version)."""
+        records = self._records
+        # postorder so that the children are copied first
+        stack = [(self.root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if node is None:
+                continue
+            if children_done:
+                records[node] = VersionNode(node,
+                                            records.get(node.left),
+                                            records.get(node.right))
+            else:
+                stack.append((node, True))
+                stack.append((node.left, False))
+                stack.append((node.right, False))
+            #endif
+        #endwhile
+        return records.get(self.root)
+    #end_copy_all
+
+    def _copy_path(self):
+        """
+        Path copying: copy the records of all changed nodes and their
+        ancestors, share everything else with the previous version.
+        """
+        dirty = set()
+        for node in self._changes:
+            while node is not None and node not in dirty:
+                dirty.add(node)
+                node = node.parent
+            #endwhile
+        #endfor
+        self._changes.clear()
+
+        if not dirty:
+            return self._records[self.root]
+
+        records = self._records
+
+        def copy(node):
+            if node is None:
+                return None
+            if node not in dirty:
+                return records[node]
+            record = VersionNode(node, copy(node.left), copy(node.right))
+            records[node] = record
+            return record
+        #end_copy
+
+        return copy(self.root)
+    #end_copy_path
+#end_PersistentTangoTree
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Opt-in profiling of the Tango Tree restructuring primitives.
+
+A Profiler wraps selected methods of one tree instance:
+
+    t = TangoTree(range(1000))
+    prof = Profiler()
+    with prof.attached(t):
+        for key in keys:
+            t.search(key)
+
+    print(prof.report())
+    prof.pstats().sort_stats('cumulative').print_stats()
+    open('tango.folded', 'w').write(prof.collapsed())   # flamegraph.pl input
+
+The wrappers are instance attributes shadowing the class methods, so a tree
+without an attached profiler runs exactly the same code as before and pays
+nothing. Callbacks registered with add_callback() are invoked on every
+profiled call, e.g. to build an operation log.
+
+A Profiler is not thread-safe; profile a tree from the thread that owns it.
+"""
+
+import contextlib
+import pstats
+import time
+
+
+# The methods profiled by default. Names a tree does not have are skipped.
+PROFILED_METHODS = (
+    'search',
+    '_switch',
+    '_split',
+    '_join',
+    '_aux_merge',
+    '_aux_update_depths',
+)
+
+
+class Profiler(object):
+
+    """
+    Collects call counts, inclusive and exclusive time per method.
+
+    Args:
+        methods (iterable of str, optional): names of the methods to wrap,
+            default PROFILED_METHODS.
+    """
+
+    def __init__(self, methods=PROFILED_METHODS):
+        self.methods = tuple(methods)
+        # name -> code location (filename, lineno, name) for pstats
+        self._code = {}
+        self._stack = []      # frames of the running calls: [name, child s]
+        self.clear()
+        self._callbacks = []
+        self._attached = {}   # id(tree) -> (tree, [wrapped names])
+    #end__init__
+
+    def clear(self):
+        """Forget all collected data."""
+        # name -> [calls, inclusive s, exclusive s]
+        self.totals = {}
+        # (caller name, name) -> [calls, inclusive s, exclusive s]
+        self._edges = {}
+        # call stack tuple -> exclusive s
+        self._stacks = {}
+    #end_clear
+
+    def add_callback(self, callback):
+        """
+        Register callback(name, inclusive, exclusive, depth) to be invoked
+        after every profiled call. depth is 0 for outermost calls.
+        """
+        self._callbacks.append(callback)
+    #end_add_callback
+
+    def remove_callback(self, callback):
+        self._callbacks.remove(callback)
+
+    def attach(self, tree):
+        """Start profiling tree."""
+        if id(tree) in self._attached:
+            return
+        wrapped = []
+        for name in self.methods:
+            method = getattr(tree, name, None)
+            if method is None:
+                continue
+            setattr(tree, name, self._wrap(name, method))
+            wrapped.append(name)
+        #endfor
+        self._attached[id(tree)] = (tree, wrapped)
+    #end_attach
+
+    def detach(self, tree):
+        """Stop profiling tree and restore its original methods."""
+        tree, wrapped = self._attached.pop(id(tree), (tree, []))
+        for name in wrapped:
+            # removing the instance attribute uncovers the class method
+            delattr(tree, name)
+    #end_detach
+
+    @contextlib.contextmanager
+    def attached(self, tree):
+        """Context manager profiling tree inside the with-block."""
+        self.attach(tree)
+        try:
+            yield self
+        finally:
+            self.detach(tree)
+    #end_attached
+
+    def _wrap(self, name, method):
+        func = getattr(method, '__func__', method)
+        code = getattr(func, '__code__', None)
+        if code is not None:
+            self._code[name] = (code.co_filename, code.co_firstlineno, name)
+        else:
+            self._code[name] = ('~', 0, name)
+
+        stack = self._stack
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            frame = [name, 0.0]
+            stack.append(frame)
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                inclusive = clock() - start
+                stack.pop()
+                self._record(frame, inclusive)
+            #endtry
+        #end_wrapper
+
+        wrapper.__name__ = name
+        wrapper.__wrapped__ = method
+        return wrapper
+    #end_wrap
+
+    def _record(self, frame, inclusive):
+        name, child_time = frame
+        exclusive = inclusive - child_time
+        stack = self._stack
+
+        # Recursive calls are already contained in the inclusive time of
+        # the outermost call of the same method.
+        recursive = any(f[0] == name for f in stack)
+
+        total = self.totals.get(name)
+        if total is None:
+            total = self.totals[name] = [0, 0.0, 0.0]
+        total[0] += 1
+        if not recursive:
+            total[1] += inclusive
+        total[2] += exclusive
+
+        caller = stack[-1][0] if stack else None
+        edge = self._edges.get((caller, name))
+        if edge is None:
+            edge = self._edges[(caller, name)] = [0, 0.0, 0.0]
+        edge[0] += 1
+        edge[1] += inclusive
+        edge[2] += exclusive
+
+        path = tuple(f[0] for f in stack) + (name,)
+        self._stacks[path] = self._stacks.get(path, 0.0) + exclusive
+
+        if stack:
+            stack[-1][1] += inclusive
+
+        for callback in self._callbacks:
+            callback(name, inclusive, exclusive, len(stack))
+    #end_record
+
+    def report(self):
+        """Returns a table of calls, inclusive and exclusive time."""
+        lines = ['{:<22}{:>10}{:>14}{:>14}{:>14}'.format(
+            'method', 'calls', 'incl [s]', 'excl [s]', 'us/call')]
+        ordered = sorted(self.totals.items(), key=lambda item: -item[1][1])
+        for name, (calls, inclusive, exclusive) in ordered:
+            lines.append('{:<22}{:>10}{:>14.6f}{:>14.6f}{:>14.3f}'.format(
+                name, calls, inclusive, exclusive, 1e6 * exclusive / calls))
+        return '\n'.join(lines)
+    #end_report
+
+    def collapsed(self):
+        """
+        Returns the exclusive time per call stack in the collapsed-stack
+        format read by flamegraph.pl and speedscope, i.e. one line
+        "outer;inner;innermost <microseconds>" per stack.
+        """
+        lines = []
+        for path, exclusive in sorted(self._stacks.items()):
+            lines.append('{} {}'.format(';'.join(path),
+                                        int(round(exclusive * 1e6))))
+        return '\n'.join(lines) + ('\n' if lines else '')
+    #end_collapsed
+
+    def pstats(self):
+        """
+        Returns the collected data as pstats.Stats, so it can be sorted,
+        printed or dumped with dump_stats() and opened in any tool that
+        reads cProfile output (snakeviz, gprof2dot, ...).
+        """
+        return pstats.Stats(_PstatsExport(self._pstats_dict()))
+    #end_pstats
+
+    def dump_stats(self, filename):
+        """Write the data in cProfile's binary format to filename."""
+        self.pstats().dump_stats(filename)
+    #end_dump_stats
+
+    def _pstats_dict(self):
+        # {func: (primitive calls, calls, tottime, cumtime, callers)}
+        # with callers = {caller func: (pc, calls, tottime, cumtime)}
+        stats = {}
+        for name, (calls, inclusive, exclusive) in self.totals.items():
+            stats[self._code[name]] = (calls, calls, exclusive, inclusive, {})
+        for (caller, name), (calls, inclusive, exclusive) in \
+                self._edges.items():
+            if caller is None:
+                continue
+            callers = stats[self._code[name]][4]
+            callers[self._code[caller]] = (calls, calls, exclusive, inclusive)
+        #endfor
+        return stats
+    #end_pstats_dict
+#end_Profiler
+
+
+class _PstatsExport(object):
+
+    """The minimal profiler interface pstats.Stats can load from."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+#end_PstatsExport
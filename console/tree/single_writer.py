@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Single-writer concurrency mode for self-adjusting trees.
+
+Every TangoTree.search restructures the tree (cuts, joins and rotations),
+so even a "read" is a write and the tree can not be shared between threads
+as it is. Instead of putting a global lock around every call, SingleWriter
+funnels all searches through one mutator thread that owns the tree:
+
+    tango = TangoTree(range(1000))
+    writer = SingleWriter(tango)
+
+    future = writer.submit(42)      # from any thread
+    future.result()                 # 42
+
+    writer.search(42)               # blocking shortcut for the above
+    writer.close()
+
+Callers never touch the tree directly. Requests are served in FIFO order,
+so the sequence of accesses seen by the tree is a valid serialization of the
+concurrent calls and the tree keeps its amortized guarantees.
+
+The writer exposes queue depth and queue wait time via stats(), which is
+what you want to watch to decide whether one mutator keeps up with the
+request handlers.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+_STOP = object()   # sentinel telling the worker to exit
+
+
+class SingleWriter(object):
+
+    """
+    Serialize all operations on a tree through a single worker thread.
+
+    Args:
+        tree (BinaryTree): The tree owned by the worker. Nobody else must
+            access it while the writer is running.
+        maxsize (int, optional): Maximum number of queued requests,
+            default 0 (unbounded). submit() blocks while the queue is full.
+        name (str, optional): Name of the worker thread.
+    """
+
+    def __init__(self, tree, maxsize=0, name='tango-writer'):
+        self.tree = tree
+
+        self._queue = queue.Queue(maxsize)
+        # _submit_lock orders submissions against close(), _lock protects
+        # the metrics below. The worker only ever takes _lock so a submit
+        # blocked on a full queue can not stall it.
+        self._submit_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._max_depth = 0
+
+        self._worker = threading.Thread(target=self._run, name=name)
+        self._worker.daemon = True
+        self._worker.start()
+    #end__init__
+
+    def submit(self, key, method='search'):
+        """
+        Queue method(key) for execution on the tree.
+
+        Returns:
+            concurrent.futures.Future: resolves to the result of
+            tree.<method>(key) or to the exception it raised.
+        """
+        future = Future()
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("SingleWriter is closed")
+            self._queue.put((future, method, key, time.perf_counter()))
+        #endwith
+
+        with self._lock:
+            self._submitted += 1
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+        return future
+    #end_submit
+
+    def search(self, key, timeout=None):
+        """Blocking search, i.e. submit(key).result(timeout)."""
+        return self.submit(key).result(timeout)
+    #end_search
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+
+            future, method, key, enqueued = item
+            wait = time.perf_counter() - enqueued
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = getattr(self.tree, method)(key)
+                except BaseException as e:
+                    future.set_exception(e)
+                    failed = 1
+                else:
+                    future.set_result(result)
+                    failed = 0
+                #endtry
+            else:
+                # cancelled while waiting in the queue
+                failed = 0
+            #endif
+
+            with self._lock:
+                self._completed += 1
+                self._failed += failed
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            self._queue.task_done()
+        #endwhile
+    #end_run
+
+    def stats(self):
+        """
+        Returns:
+            dict: a snapshot of the writer metrics
+                - queue_depth: requests currently waiting
+                - max_queue_depth: highest queue depth seen so far
+                - submitted, completed, failed: request counters
+                - avg_wait, max_wait: time in s requests spent in the queue
+                  before the worker picked them up
+        """
+        with self._lock:
+            completed = self._completed
+            return {
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_depth,
+                'submitted': self._submitted,
+                'completed': completed,
+                'failed': self._failed,
+                'avg_wait': self._total_wait / completed if completed else 0.0,
+                'max_wait': self._max_wait,
+            }
+    #end_stats
+
+    def join(self):
+        """Block until every queued request has been processed."""
+        self._queue.join()
+    #end_join
+
+    def close(self, wait=True):
+        """
+        Stop accepting requests. Requests already queued are still served.
+        """
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        if wait:
+            self._worker.join()
+    #end_close
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+#end_SingleWriter
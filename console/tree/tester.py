@@ -1,4 +1,5 @@
 import tango_strict as tg
+from lazy import LazyTangoTree
 import math
 
 
@@ -19,16 +20,16 @@ def test_console():
 	while True:
 		try:
 			tree_range = int(input('Tree values range: '))
-			if tree_range > 0 and tree_range < 1000 * 1000:
+			if tree_range > 0 and tree_range < 1000 * 1000 * 1000:
 				break
 			else:
-				raise Exception('Please use the values range less than 10^6 and greater than 0 (int)')
+				raise Exception('Please use the values range less than 10^9 and greater than 0 (int)')
 		except Exception as e:
 			print(e)
 
 	tango_bst = None
 	try:
-		tango_bst = tg.TangoTree(range(tree_range))
+		tango_bst = LazyTangoTree(range(tree_range))
 	except Exception as e:
 		print(e)
 	
@@ -99,14 +100,14 @@ if __name__ == "__main__":
 			print('Test size cannot be empty or negative!')
 			continue
 
-		if m > 1000 * 1000:
+		if m > 1000 * 1000 * 1000:
 			print('Please, choose smaller items range')
 			continue
 		if m <= 0:
 			print('Values range cannot be negative!')
 			continue
 
-		tango_bst = tg.TangoTree(range(m))
+		tango_bst = LazyTangoTree(range(m))
 		start = time.time()
 		for i in range(n):
 			line = ''